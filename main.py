@@ -1,15 +1,20 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from prisma import Prisma
 from src.admins.router import router as admin_router
 from src.auth.router import router as auth_router
+from src.auth.utils import get_current_admin
 from src.config import settings
+from src.db.mongodb import get_database
 from src.db.mongodb_utils import close_mongo_connection, connect_to_mongo
+from src.learn.indexes import learn_indexes
 from src.live_class.router import router as live_class_router
+from src.metrics import metrics
 from src.modules.router import router as module_router
 from src.learn.router import router as learn_router
+from src.openai.providers import close_openai_session
 from src.organizations.router import router as organization_router
 from src.quiz.router import router as quiz_router
 from src.quiz_responses.router import router as quiz_responses_router
@@ -28,12 +33,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # cursor of the next page of paginated lists.
+    expose_headers=["X-Next-Cursor"],
 )
 
 
 @app.on_event("startup")
 async def init_db_connection():
     await connect_to_mongo()
+    await learn_indexes.ensure_indexes(await get_database())
     db = Prisma(auto_register=True)
     await db.connect()
     app.db = db
@@ -42,6 +50,7 @@ async def init_db_connection():
 @app.on_event("shutdown")
 async def close_db_connection():
     await close_mongo_connection()
+    await close_openai_session()
     await app.db.disconnect()
 
 
@@ -50,6 +59,11 @@ def base_route():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics_route(_: dict = Depends(get_current_admin)):
+    return metrics.snapshot()
+
+
 app.include_router(auth_router, tags=["auth"], prefix="/auth")
 app.include_router(student_router, tags=["students"], prefix="/student")
 app.include_router(teacher_router, tags=["teachers"], prefix="/teacher")
@@ -0,0 +1,26 @@
+"""
+Partial models generated into `prisma.partials` by `prisma generate`.
+
+Queries made through a partial model only select its columns, see the
+`select` argument of `CRUDBaseModel`.
+"""
+from prisma.models import Admin, Student, Teacher
+
+# columns returned by the API. Passwords, otps and rate limit counters are
+# never read for a response.
+Student.create_partial(
+    "StudentPublic",
+    exclude=[
+        "otp",
+        "otp_expires_at",
+        "otp_attempts",
+        "web_otp",
+        "web_otp_expires_at",
+        "web_otp_attempts",
+        "activation_attempts",
+        "Organization",
+        "Batch",
+    ],
+)
+Teacher.create_partial("TeacherPublic", exclude=["password", "LiveClasses"])
+Admin.create_partial("AdminPublic", exclude=["password"])
@@ -1,4 +1,5 @@
 from prisma.models import Admin
+from prisma.partials import AdminPublic
 
 from src.admins.serializers import CreateAdmin, EditAdmin
 from src.crud_base import CRUDBaseModel
@@ -6,7 +7,9 @@ from src.crud_base import CRUDBaseModel
 
 class AdminModel(CRUDBaseModel[CreateAdmin, EditAdmin]):
     def __init__(self):
-        super().__init__(Admin)
+        super().__init__(Admin, public_model=AdminPublic)
 
-    async def get_by_username(self, username: str):
-        return await super().get_unique(where={"username": username}, include={})
+    async def get_by_username(self, username: str, select=None):
+        return await super().get_unique(
+            where={"username": username}, include={}, select=select
+        )
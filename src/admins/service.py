@@ -4,12 +4,6 @@ from src.admins.model import AdminModel
 from src.admins.serializers import CreateAdmin, CreateAdminReq, EditAdmin
 
 
-def delete_password(admin: Admin):
-    if hasattr(admin, "password"):
-        del admin.password
-    return admin
-
-
 class AdminService:
     def __init__(self) -> None:
         self.model = AdminModel()
@@ -24,17 +18,19 @@ class AdminService:
         return new_admin
 
     async def get_admin(self, admin_id: int) -> Admin:
-        admin: Admin = await self.model.get(id_=admin_id)
-        admin = delete_password(admin)
+        admin: Admin = await self.model.get(
+            id_=admin_id, select=self.model.public_model
+        )
         return admin
 
     async def get_admin_by_username(self, username: str) -> Admin:
-        admin: Admin = await self.model.get_by_username(username)
-        admin = delete_password(admin)
+        admin: Admin = await self.model.get_by_username(
+            username, select=self.model.public_model
+        )
         return admin
 
     async def update_admin(self, username: str, admin_edit: EditAdmin):
-        admin = await self.get_admin_by_username(username)
-        updated_admin = await self.model.update(admin.id, admin, admin_edit)
-        delete_password(updated_admin)
+        updated_admin: Admin = await self.model.update_unique(
+            {"username": username}, admin_edit, select=self.model.public_model
+        )
         return updated_admin
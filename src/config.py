@@ -23,6 +23,10 @@ class ServerSettings(BaseSettings):
 class DatabaseSettings(BaseSettings):
     DATABASE_URL: Optional[str] = config["DATABASE_URL"]
     MONGODB_URL: Optional[str] = config["MONGODB_URL"]
+    # read-through cache of records by id, email and phone number, per worker.
+    ENTITY_CACHE_ENABLED: bool = config.get("ENTITY_CACHE_ENABLED", "true") == "true"
+    # rows per query of bulk writes, keeps queries within the engine's limits.
+    DB_BULK_CHUNK_SIZE: int = config.get("DB_BULK_CHUNK_SIZE") or 500
 
 
 class JwtTokenSettings(BaseSettings):
@@ -53,6 +57,63 @@ class GoogleOAuthCredentials(BaseSettings):
 
 class OpenAI(BaseSettings):
     OPENAI_API_KEY = config.get("OPENAI_API_KEY")
+    # seconds a single completion may take before it is cancelled.
+    OPENAI_REQUEST_TIMEOUT: float = config.get("OPENAI_REQUEST_TIMEOUT") or 60
+    # max open connections kept in the shared HTTP pool.
+    OPENAI_MAX_CONNECTIONS: int = config.get("OPENAI_MAX_CONNECTIONS") or 100
+    # one of "openai", "record", "replay" or "fake", see `src/openai/providers.py`.
+    LLM_PROVIDER: str = config.get("LLM_PROVIDER") or "openai"
+    LLM_RECORDINGS_DIR: str = config.get("LLM_RECORDINGS_DIR") or ".llm_recordings"
+    # budgets of each worker, split the account's rate limits across workers.
+    LLM_REQUESTS_PER_MINUTE: int = config.get("LLM_REQUESTS_PER_MINUTE") or 500
+    LLM_TOKENS_PER_MINUTE: int = config.get("LLM_TOKENS_PER_MINUTE") or 80_000
+    # tokens reserved for a lesson completion before its usage is known.
+    LLM_COMPLETION_TOKENS_ESTIMATE: int = (
+        config.get("LLM_COMPLETION_TOKENS_ESTIMATE") or 800
+    )
+    # USD per 1000 tokens, used to report the cost of lessons.
+    LLM_PROMPT_TOKEN_PRICE: float = config.get("LLM_PROMPT_TOKEN_PRICE") or 0.0015
+    LLM_COMPLETION_TOKEN_PRICE: float = (
+        config.get("LLM_COMPLETION_TOKEN_PRICE") or 0.002
+    )
+    # prompt of lessons, see `PROMPTS` in `src/openai/service.py`.
+    LLM_PROMPT_VERSION: str = config.get("LLM_PROMPT_VERSION") or "v1"
+    # prompt version tried on `LLM_PROMPT_EXPERIMENT_SHARE` of the topics.
+    LLM_PROMPT_EXPERIMENT: Optional[str] = config.get("LLM_PROMPT_EXPERIMENT")
+    LLM_PROMPT_EXPERIMENT_SHARE: float = (
+        config.get("LLM_PROMPT_EXPERIMENT_SHARE") or 0
+    )
+    # seconds a student may wait on a lesson completion, queueing included.
+    LLM_INTERACTIVE_TIMEOUT: float = config.get("LLM_INTERACTIVE_TIMEOUT") or 30
+    # seconds after which a second, hedged request is sent for a student's
+    # lesson. Set it around the p95 completion latency, 0 disables hedging.
+    LLM_HEDGE_AFTER: float = config.get("LLM_HEDGE_AFTER") or 0
+    # consecutive failed calls opening the circuit breaker.
+    LLM_BREAKER_FAILURES: int = config.get("LLM_BREAKER_FAILURES") or 5
+    # seconds the breaker stays open before a probe call is let through.
+    LLM_BREAKER_RESET_SECONDS: float = config.get("LLM_BREAKER_RESET_SECONDS") or 30
+    # seconds before the fake provider's first token.
+    FAKE_LLM_LATENCY: float = config.get("FAKE_LLM_LATENCY") or 0.5
+    FAKE_LLM_TOKENS_PER_SECOND: float = config.get("FAKE_LLM_TOKENS_PER_SECOND") or 50
+
+
+class LearnSettings(BaseSettings):
+    # number of generated lessons held in each worker's memory.
+    LESSON_CACHE_SIZE: int = config.get("LESSON_CACHE_SIZE") or 512
+    # seconds before a worker re-reads a cached lesson from mongodb.
+    LESSON_CACHE_TTL: int = config.get("LESSON_CACHE_TTL") or 60 * 10
+    # topics generated ahead of a student when a lesson is finished, 0 disables.
+    LESSON_PREFETCH_DEPTH: int = config.get("LESSON_PREFETCH_DEPTH") or 1
+    # topics of a module generated by one completion in warm-up and prefetch.
+    LESSON_BATCH_SIZE: int = config.get("LESSON_BATCH_SIZE") or 3
+    # seconds a worker may hold a student's lesson generation lease.
+    LESSON_LEASE_SECONDS: int = config.get("LESSON_LEASE_SECONDS") or 60 * 3
+    # LLM tokens an organization's students may use per day and per month,
+    # past either one they only get lessons generated before. 0 is unlimited.
+    ORG_DAILY_TOKEN_QUOTA: int = config.get("ORG_DAILY_TOKEN_QUOTA") or 0
+    ORG_MONTHLY_TOKEN_QUOTA: int = config.get("ORG_MONTHLY_TOKEN_QUOTA") or 0
+    # seconds between checks of the module catalog version.
+    MODULE_CATALOG_CHECK_SECONDS: int = config.get("MODULE_CATALOG_CHECK_SECONDS") or 5
 
 
 class SMTPCredentials(BaseSettings):
@@ -69,6 +130,7 @@ class Settings(
     DatabaseSettings,
     GoogleOAuthCredentials,
     OpenAI,
+    LearnSettings,
     SMTPCredentials,
 ):
     pass
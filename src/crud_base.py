@@ -1,8 +1,13 @@
+from datetime import datetime
 from typing import Any, Generic, TypeVar
 
 from fastapi.encoders import jsonable_encoder
+from prisma import get_client
 from pydantic import BaseModel
+from pydantic.datetime_parse import parse_datetime
 
+from src.config import settings
+from src.entity_cache import CACHED_KEYS, EntityCache
 from src.exceptions import (
     DBCreateException,
     DBDeleteException,
@@ -14,21 +19,53 @@ from src.exceptions import (
     RecordNotFoundException,
     UniqueConstraintFailedException,
 )
+from src.utils import decode_cursor, encode_cursor
 
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
 
+class BulkChunkError(BaseModel):
+    # position of the chunk's first row in the written rows.
+    offset: int
+    size: int
+    error: str
+
+
+class BulkWriteResult(BaseModel):
+    """Rows written by a bulk write and the chunks that failed."""
+
+    count: int = 0
+    errors: list[BulkChunkError] = []
+
+
+def chunked(values: list, size: int):
+    for offset in range(0, len(values), size):
+        yield offset, values[offset : offset + size]
+
+
 class CRUDBaseModel(Generic[CreateSchemaType, UpdateSchemaType]):
-    def __init__(self, model):
+    def __init__(self, model, public_model=None, cache: EntityCache | None = None):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
 
         **Parameters**
 
         * `model`: A Prisma Client model class
+        * `public_model`: A partial model of the columns returned by the API,
+          see `prisma/partial_types.py`
+        * `cache`: A read-through cache of records by unique key, invalidated
+          by the writes of this object
         """
         self.model = model
+        self.public_model = public_model
+        self.cache = cache
+
+    def _prisma(self, select=None):
+        """Query actions of `select`, a partial model, so only its columns are
+        read, or of the whole model.
+        """
+        return (select or self.model).prisma()
 
     @staticmethod
     def get_update_data(new_data):
@@ -59,36 +96,120 @@ class CRUDBaseModel(Generic[CreateSchemaType, UpdateSchemaType]):
                 setattr(old_data_obj, field, update_data[field])
         return old_data_obj.dict(exclude_none=True)
 
-    async def get(self, id_: Any, include=None):
-        if include is not None:
-            record = await self.model.prisma().find_unique(
-                where={"id": id_}, include=include
-            )
-        else:
-            record = await self.model.prisma().find_unique(
-                where={"id": id_}, include=include
+    async def _find_unique(self, where: dict, include=None, select=None):
+        """`find_unique` through the cache when `where` is a single cached key."""
+        if (
+            self.cache is None
+            or len(where) != 1
+            or next(iter(where)) not in CACHED_KEYS
+            or not self.cache.is_cacheable(include, select)
+        ):
+            return await self._prisma(select).find_unique(
+                where=where, include=include
             )
 
+        field, value = next(iter(where.items()))
+        record = self.cache.get(field, value, select)
+        if record is None:
+            record = await self._prisma(select).find_unique(where=where)
+            if record:
+                self.cache.set(field, value, record, select)
+        return record
+
+    def _invalidate(self, record):
+        """Drop a written record from the cache, under every key."""
+        if self.cache is not None and record:
+            self.cache.invalidate(record.id)
+
+    async def get(self, id_: Any, include=None, select=None):
+        record = await self._find_unique({"id": id_}, include, select)
         if not record:
             raise RecordNotFoundException(id_)
         return record
 
-    async def find_many(self, where, include, skip=0, limit=100):
-        record = await self.model.prisma().find_many(
+    async def find_many(self, where, include, skip=0, limit=100, select=None):
+        record = await self._prisma(select).find_many(
             where=where, include=include, skip=skip, take=limit
         )
         return record
 
+    async def find_page(
+        self,
+        where: dict | None = None,
+        include: dict | None = None,
+        cursor: str | None = None,
+        limit: int = 100,
+        order_by: str = "id",
+        skip: int = 0,
+        select=None,
+    ) -> tuple[list, str | None]:
+        """Get a page of records ordered by `(order_by, id)`.
+
+        A `cursor` encodes the `(order_by, id)` of the last record of the
+        previous page. The page is sought from there through the index rather
+        than by walking `skip` rows, so every page costs the same as the
+        first. `skip` is only applied without a cursor, for older clients.
+
+        Returns:
+            tuple: the records and the cursor of the next page, None on the
+            last page.
+        """
+        if cursor:
+            sort_value, last_id = decode_cursor(cursor, size=2)
+            if order_by == "id":
+                seek: dict = {"id": {"gt": last_id}}
+            else:
+                sort_value = self._parse_sort_value(order_by, sort_value)
+                seek = {
+                    "OR": [
+                        {order_by: {"gt": sort_value}},
+                        {order_by: sort_value, "id": {"gt": last_id}},
+                    ]
+                }
+            where = {"AND": [where, seek]} if where else seek
+            skip = 0
+
+        order: list[dict] = [{order_by: "asc"}]
+        if order_by != "id":
+            # ties of `order_by` are ordered by id, the cursor's second key.
+            order.append({"id": "asc"})
+        try:
+            records = await self._prisma(select).find_many(
+                where=where,
+                include=include,
+                skip=skip,
+                # one more record tells whether there is a next page.
+                take=limit + 1,
+                order=order,
+            )
+        except Exception as e:
+            raise QueryException(e)
+
+        next_cursor: str | None = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = encode_cursor(
+                [getattr(records[-1], order_by), records[-1].id]
+            )
+        return records, next_cursor
+
+    def _parse_sort_value(self, order_by: str, value):
+        """Restore a sort value decoded from a cursor to its field's type."""
+        field = self.model.__fields__.get(order_by)
+        if field is not None and field.type_ is datetime and value is not None:
+            return parse_datetime(value)
+        return value
+
     async def get_groups(self, group_by: list[str], where: dict[str, any]):
         record = await self.model.prisma().group_by(by=group_by, where=where)
         if not record:
             raise NoSuchRecordException("record group not found")
         return record
 
-    async def get_unique(self, where, include=None):
+    async def get_unique(self, where, include=None, select=None):
         if not include:
             include = {}
-        record = await self.model.prisma().find_unique(where=where, include=include)
+        record = await self._find_unique(where, include, select)
         if not record:
             raise NoSuchRecordException("No such unique record found")
         return record
@@ -97,16 +218,14 @@ class CRUDBaseModel(Generic[CreateSchemaType, UpdateSchemaType]):
         record = await self.model.prisma().find_first(where=where, include=include)
         return record
 
-    async def get_by_email(self, email: str):
-        record = await self.model.prisma().find_unique(where={"email": email})
+    async def get_by_email(self, email: str, select=None):
+        record = await self._find_unique({"email": email}, select=select)
         if not record:
             raise EmailNotFoundException(email)
         return record
 
-    async def get_by_phone_number(self, phone_number: str):
-        record = await self.model.prisma().find_unique(
-            where={"phone_number": phone_number}
-        )
+    async def get_by_phone_number(self, phone_number: str, select=None):
+        record = await self._find_unique({"phone_number": phone_number}, select=select)
         if not record:
             raise PhoneNumberNotFoundException(phone_number)
         return record
@@ -153,6 +272,130 @@ class CRUDBaseModel(Generic[CreateSchemaType, UpdateSchemaType]):
         except Exception as e:
             raise DBCreateException(e)
 
+    async def _write_chunks(
+        self, values: list, write, chunk_size: int | None = None
+    ) -> BulkWriteResult:
+        """Await `write(chunk)`, the rows it wrote, for each chunk of `values`.
+        A failed chunk is recorded and the next chunks are still written.
+        """
+        result = BulkWriteResult()
+        chunk_size = chunk_size or settings.DB_BULK_CHUNK_SIZE
+        for offset, chunk in chunked(values, chunk_size):
+            try:
+                result.count += await write(chunk)
+            except Exception as e:
+                result.errors.append(
+                    BulkChunkError(offset=offset, size=len(chunk), error=str(e))
+                )
+        return result
+
+    async def _write_where(
+        self, write, where: dict | None, ids: list | None, chunk_size: int | None
+    ) -> BulkWriteResult:
+        """Await `write(where)` once, or once per chunk of `ids` with `where`
+        narrowed to the chunk, so the `IN` list stays within query limits.
+        """
+        if where is None and ids is None:
+            raise ValueError("bulk writes need a `where` or `ids`")
+        if ids is None:
+            return await self._write_chunks([where], lambda chunk: write(chunk[0]))
+
+        def write_ids(chunk: list):
+            ids_where: dict = {"id": {"in": chunk}}
+            return write({"AND": [where, ids_where]} if where else ids_where)
+
+        return await self._write_chunks(ids, write_ids, chunk_size)
+
+    def _invalidate_many(self, ids: list | None):
+        """Drop the records of a bulk write from the cache, every record when
+        the written ids are not known.
+        """
+        if self.cache is None:
+            return
+        if ids is None:
+            self.cache.clear()
+            return
+        for id_ in ids:
+            self.cache.invalidate(id_)
+
+    async def update_many(
+        self,
+        data: dict,
+        where: dict | None = None,
+        ids: list | None = None,
+        chunk_size: int | None = None,
+    ) -> BulkWriteResult:
+        """Set `data` on the records matching `where`, or on the records of
+        `ids` matching it, `chunk_size` ids per query.
+        """
+        result = await self._write_where(
+            lambda chunk_where: self.model.prisma().update_many(
+                data=data, where=chunk_where
+            ),
+            where,
+            ids,
+            chunk_size,
+        )
+        self._invalidate_many(ids)
+        return result
+
+    async def delete_many(
+        self,
+        where: dict | None = None,
+        ids: list | None = None,
+        chunk_size: int | None = None,
+    ) -> BulkWriteResult:
+        """Delete the records matching `where`, or the records of `ids`
+        matching it, `chunk_size` ids per query.
+        """
+        result = await self._write_where(
+            lambda chunk_where: self.model.prisma().delete_many(where=chunk_where),
+            where,
+            ids,
+            chunk_size,
+        )
+        self._invalidate_many(ids)
+        return result
+
+    async def upsert_many(
+        self,
+        obj_in: list[CreateSchemaType],
+        unique_field: str = "id",
+        update_fields: list[str] | None = None,
+        chunk_size: int | None = None,
+    ) -> BulkWriteResult:
+        """Create each object, or update the record with its `unique_field`.
+
+        An existing record gets the object's `update_fields`, or all of its
+        set fields. Each chunk is upserted in one transaction, so a failed
+        chunk writes none of its rows.
+        """
+        rows: list[dict] = jsonable_encoder(obj_in, exclude_unset=True)
+
+        async def write(chunk: list[dict]) -> int:
+            async with get_client().batch_() as batcher:
+                actions = getattr(batcher, self.model.__name__.lower())
+                for row in chunk:
+                    actions.upsert(
+                        where={unique_field: row[unique_field]},
+                        data={
+                            "create": row,
+                            "update": {
+                                field: value
+                                for field, value in row.items()
+                                if field != unique_field
+                                and (update_fields is None or field in update_fields)
+                            },
+                        },
+                    )
+            return len(chunk)
+
+        result = await self._write_chunks(rows, write, chunk_size)
+        self._invalidate_many(
+            [row["id"] for row in rows] if unique_field == "id" else None
+        )
+        return result
+
     async def update(self, _id: int, old_data, new_data: UpdateSchemaType):
         update_data = CRUDBaseModel.get_update_data(new_data)
         updated_data = CRUDBaseModel.update_old_data(
@@ -163,10 +406,47 @@ class CRUDBaseModel(Generic[CreateSchemaType, UpdateSchemaType]):
             result = await self.model.prisma().update(
                 where={"id": _id}, data=updated_data
             )
+            self._invalidate(result)
             return result
         except Exception as e:
             raise DBUpdateException(e)
 
+    async def _update_partial(self, where: dict, new_data, select=None):
+        # unset and None fields are left as they are, like `update_old_data`.
+        update_data: dict = {
+            field: value
+            for field, value in CRUDBaseModel.get_update_data(new_data).items()
+            if value is not None
+        }
+        if not update_data:
+            return await self._find_unique(where, select=select)
+
+        try:
+            result = await self._prisma(select).update(where=where, data=update_data)
+        except Exception as e:
+            raise DBUpdateException(e)
+        self._invalidate(result)
+        return result
+
+    async def update_partial(self, id_: Any, new_data: UpdateSchemaType, select=None):
+        """Write only the fields set in `new_data`, without reading the record
+        first, and return the updated record, or its `select` columns.
+
+        Raises:
+            RecordNotFoundException: when there is no record with `id_`
+        """
+        record = await self._update_partial({"id": id_}, new_data, select)
+        if not record:
+            raise RecordNotFoundException(id_)
+        return record
+
+    async def update_unique(self, where: dict, new_data: UpdateSchemaType, select=None):
+        """`update_partial` of the record matching a unique `where`."""
+        record = await self._update_partial(where, new_data, select)
+        if not record:
+            raise NoSuchRecordException("No such unique record found")
+        return record
+
     async def update_by_email(self, email: str, old_data, new_data: UpdateSchemaType):
         update_data = CRUDBaseModel.get_update_data(new_data)
         updated_data = CRUDBaseModel.update_old_data(
@@ -177,6 +457,7 @@ class CRUDBaseModel(Generic[CreateSchemaType, UpdateSchemaType]):
             result = await self.model.prisma().update(
                 where={"email": email}, data=updated_data
             )
+            self._invalidate(result)
             return result
         except Exception as e:
             raise DBUpdateException(e)
@@ -184,6 +465,7 @@ class CRUDBaseModel(Generic[CreateSchemaType, UpdateSchemaType]):
     async def update_field(self, where: dict, data: dict):
         try:
             result = await self.model.prisma().update(where=where, data=data)
+            self._invalidate(result)
             return result
         except Exception as e:
             raise DBUpdateException(e)
@@ -201,7 +483,8 @@ class CRUDBaseModel(Generic[CreateSchemaType, UpdateSchemaType]):
             _type_: JSON object with `status` and `message`
         """
         try:
-            await self.model.prisma().delete(where={"id": id_})
+            record = await self.model.prisma().delete(where={"id": id_})
+            self._invalidate(record)
             deleted = {
                 "status": "Success",
                 "message": f"Resource with id : {id_} deleted",
@@ -213,7 +496,8 @@ class CRUDBaseModel(Generic[CreateSchemaType, UpdateSchemaType]):
 
     async def remove_by_email(self, email: str):
         try:
-            await self.model.prisma().delete(where={"email": email})
+            record = await self.model.prisma().delete(where={"email": email})
+            self._invalidate(record)
             deleted = {
                 "status": "Success",
                 "message": f"Resource with email : {email} deleted",
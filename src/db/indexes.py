@@ -0,0 +1,94 @@
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pydantic import BaseModel
+from pymongo.errors import PyMongoError
+
+
+class IndexSpec(BaseModel):
+    collection: str
+    # `(field, direction)` pairs, e.g. `[("user_id", 1), ("created_at", -1)]`.
+    keys: list[tuple[str, int]]
+    unique: bool = False
+
+
+class QueryShape(BaseModel):
+    """A query the application runs, it must be served by an index."""
+
+    name: str
+    collection: str
+    filter: dict
+    sort: list[tuple[str, int]] | None = None
+
+
+def find_collection_scans(plan: dict) -> list[str]:
+    """Get the stages of a query plan that scan a whole collection."""
+    stages: list[str] = []
+    if plan.get("stage") == "COLLSCAN":
+        stages.append("COLLSCAN")
+
+    for child in ("inputStage", "queryPlan", "winningPlan"):
+        if isinstance(plan.get(child), dict):
+            stages.extend(find_collection_scans(plan[child]))
+    for child_plan in plan.get("inputStages", []):
+        stages.extend(find_collection_scans(child_plan))
+
+    return stages
+
+
+class IndexRegistry:
+    """
+    Indexes and query shapes of a mongodb database.
+    Indexes are created at startup, query shapes are checked with `explain()`.
+    """
+
+    def __init__(self, database: str) -> None:
+        self.database = database
+        self.indexes: list[IndexSpec] = []
+        self.query_shapes: list[QueryShape] = []
+
+    def add_index(self, collection: str, keys: list[tuple[str, int]], unique=False):
+        self.indexes.append(IndexSpec(collection=collection, keys=keys, unique=unique))
+
+    def add_query_shape(
+        self,
+        name: str,
+        collection: str,
+        filter: dict,
+        sort: list[tuple[str, int]] | None = None,
+    ):
+        self.query_shapes.append(
+            QueryShape(name=name, collection=collection, filter=filter, sort=sort)
+        )
+
+    async def ensure_indexes(self, client: AsyncIOMotorClient):
+        """Create missing indexes, existing indexes are left untouched."""
+        db = client[self.database]
+        for index in self.indexes:
+            try:
+                await db[index.collection].create_index(
+                    index.keys, unique=index.unique
+                )
+            except PyMongoError as e:
+                logging.error(
+                    f"db-index: could not create {index.keys} on {index.collection}: {e}"
+                )
+
+    async def check_query_shapes(self, client: AsyncIOMotorClient) -> list[str]:
+        """Explain every query shape.
+
+        Returns:
+            list[str]: names of the query shapes that scan a whole collection.
+        """
+        db = client[self.database]
+        failed: list[str] = []
+        for shape in self.query_shapes:
+            cursor = db[shape.collection].find(shape.filter)
+            if shape.sort:
+                cursor = cursor.sort(shape.sort)
+
+            plan: dict = await cursor.explain()
+            if find_collection_scans(plan.get("queryPlanner", {})):
+                failed.append(shape.name)
+
+        return failed
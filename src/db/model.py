@@ -1,8 +1,13 @@
 from datetime import datetime, timezone
-from typing import Optional
+from enum import Enum
+from typing import Any, Callable, Optional, TypeVar
 
 from bson.objectid import ObjectId
 from pydantic import BaseModel, Field
+from pydantic.datetime_parse import parse_datetime
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
 
 
 class PyObjectId(ObjectId):
@@ -25,6 +30,81 @@ def datetime_now() -> datetime:
     return datetime.now(tz=timezone.utc)
 
 
+def _get_field_converter(field: ModelField) -> Callable[[Any], Any] | None:
+    """Cheap conversion of a stored value of `field`, None if it is stored
+    as is.
+    """
+    type_ = field.type_
+    if field.shape not in (SHAPE_SINGLETON, SHAPE_LIST) or not isinstance(
+        type_, type
+    ):
+        convert = None
+    elif issubclass(type_, BaseModel):
+
+        def convert(value):
+            return construct_trusted(type_, value) if isinstance(value, dict) else value
+
+    elif issubclass(type_, ObjectId):
+        convert = ObjectId
+    elif issubclass(type_, Enum):
+        convert = type_
+    elif issubclass(type_, datetime):
+        convert = parse_datetime
+    elif issubclass(type_, (str, int, float, bool)):
+        return None
+    else:
+        convert = None
+
+    if convert is None:
+        # unknown type, fall back to pydantic's validation of the field.
+        def convert(value):
+            validated, errors = field.validate(value, {}, loc=field.name)
+            if errors:
+                raise ValueError(f"invalid stored {field.name}: {value!r}")
+            return validated
+
+        return convert
+
+    if field.shape == SHAPE_LIST:
+        convert_item = convert
+
+        def convert(value):
+            return [convert_item(item) for item in value]
+
+    return convert
+
+
+# model class -> (field name, alias, converter) of each of its fields.
+_construct_plans: dict[type, list[tuple[str, str, Callable | None]]] = {}
+
+
+def construct_trusted(model: type[ModelT], data: dict) -> ModelT:
+    """Build a model from data that was validated when it was written,
+    e.g. a mongodb document, without validating it again.
+
+    Nested models, enums, object ids and datetimes are still converted from
+    their stored form, which is much cheaper than `model(**data)`. Missing
+    fields get their default.
+    """
+    plan = _construct_plans.get(model)
+    if plan is None:
+        plan = _construct_plans[model] = [
+            (name, field.alias, _get_field_converter(field))
+            for name, field in model.__fields__.items()
+        ]
+
+    values: dict = {}
+    for name, alias, convert in plan:
+        if alias in data:
+            value = data[alias]
+        elif name in data:
+            value = data[name]
+        else:
+            continue
+        values[name] = convert(value) if convert and value is not None else value
+    return model.construct(**values)
+
+
 class DateTimeModelMixin(BaseModel):
     created_at: Optional[datetime] = Field(default_factory=datetime_now)
     updated_at: Optional[datetime] = Field(default_factory=datetime_now)
@@ -35,6 +115,11 @@ class DBModelMixin(DateTimeModelMixin):
 
 
 class RWModel(DBModelMixin):
+    @classmethod
+    def from_db(cls: type[ModelT], document: dict) -> ModelT:
+        """Build the model from a stored document, see `construct_trusted`."""
+        return construct_trusted(cls, document)
+
     class Config:
         allow_population_by_field_name = (True,)
         arbitrary_types_allowed = (True,)
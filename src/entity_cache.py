@@ -0,0 +1,92 @@
+from typing import Any
+
+from cachetools import TTLCache
+
+from src.config import settings
+from src.metrics import metrics
+
+# unique fields records are looked up by through the cache.
+CACHED_KEYS = ("id", "email", "phone_number")
+
+
+def record_size(record) -> int:
+    """Approximate memory held by a cached record, its JSON length."""
+    return len(record.json())
+
+
+class EntityCache:
+    """
+    Worker local read-through cache of a model's records by unique key,
+    see `CACHED_KEYS`, bounded to `max_bytes` of records.
+
+    Writes made through `CRUDBaseModel` drop the written record, under every
+    key, in this worker only. Other workers may serve it for up to `ttl`
+    seconds, keep `ttl` short for records that change often.
+
+    Records are copied in and out, callers may change them. Unless
+    `cache_full_rows` is set only partial models (`select`) are cached, so
+    secrets and rate limit counters are always read fresh.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_bytes: int = 1024 * 1024,
+        cache_full_rows: bool = True,
+    ) -> None:
+        self.name = name
+        self.cache_full_rows = cache_full_rows
+        self.records: TTLCache = TTLCache(
+            maxsize=max_bytes, ttl=ttl, getsizeof=record_size
+        )
+        # record id -> keys of its entries, to drop every entry of a record.
+        self.keys_by_id: dict[Any, set[tuple]] = {}
+        self.hits = metrics.counter(f"entity_cache_{name}_hits_total")
+        self.misses = metrics.counter(f"entity_cache_{name}_misses_total")
+        metrics.gauge(f"entity_cache_{name}_bytes", lambda: self.records.currsize)
+
+    def is_cacheable(self, include, select) -> bool:
+        if not settings.ENTITY_CACHE_ENABLED or include:
+            # included relations change with other tables.
+            return False
+        return select is not None or self.cache_full_rows
+
+    @staticmethod
+    def _key(field: str, value, select) -> tuple:
+        return field, value, select.__name__ if select else None
+
+    def get(self, field: str, value, select=None):
+        record = self.records.get(self._key(field, value, select))
+        if record is None:
+            self.misses.inc()
+            return None
+        self.hits.inc()
+        return record.copy(deep=True)
+
+    def set(self, field: str, value, record, select=None):
+        key: tuple = self._key(field, value, select)
+        try:
+            self.records[key] = record.copy(deep=True)
+        except ValueError:
+            # larger than the whole cache.
+            return
+        self.keys_by_id.setdefault(record.id, set()).add(key)
+        if len(self.keys_by_id) > 2 * len(self.records) + 100:
+            self._prune_keys()
+
+    def invalidate(self, record_id):
+        """Drop every entry of a record, whichever key it was read by."""
+        for key in self.keys_by_id.pop(record_id, ()):
+            self.records.pop(key, None)
+
+    def clear(self):
+        self.records.clear()
+        self.keys_by_id.clear()
+
+    def _prune_keys(self):
+        """Forget the keys of entries evicted or expired since they were set."""
+        keys_by_id: dict[Any, set[tuple]] = {}
+        for key, record in list(self.records.items()):
+            keys_by_id.setdefault(record.id, set()).add(key)
+        self.keys_by_id = keys_by_id
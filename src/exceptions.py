@@ -61,3 +61,11 @@ class DBDeleteException(HTTPException):
         super().__init__(
             status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"DB Delete Error : {error}"
         )
+
+
+class InvalidCursorException(HTTPException):
+    def __init__(self, cursor: str):
+        super().__init__(
+            status.HTTP_400_BAD_REQUEST,
+            f'invalid page cursor "{cursor}".',
+        )
@@ -0,0 +1,100 @@
+"""
+Compare validating and trusted construction of stored learn models.
+
+    python -m src.learn.benchmark --sections 20 --runs 2000
+
+Documents are built the way they are stored in mongodb, the validating
+path is `Model(**document)`, the trusted one `Model.from_db(document)`.
+"""
+import argparse
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+
+from src.db.model import construct_trusted
+from src.learn.model import (
+    ContentBlockModel,
+    ContentType,
+    GenerationModel,
+    SectionModel,
+)
+from src.learn.serializers import LessonModel, ModuleModel, TopicModel
+
+
+def make_lesson_document(section_count: int) -> dict:
+    sections: list[SectionModel] = [
+        SectionModel(
+            id=section_id,
+            content=[
+                ContentBlockModel(type=ContentType.HEADING, text="A heading"),
+                ContentBlockModel(
+                    type=ContentType.PARAGRAPH, text="A paragraph of text.\n" * 4
+                ),
+                ContentBlockModel(
+                    type=ContentType.ORDERED_LIST, items=["an item"] * 5
+                ),
+                ContentBlockModel(
+                    type=ContentType.UNORDERED_LIST, items=["an item"] * 5
+                ),
+            ],
+        )
+        for section_id in range(1, section_count + 1)
+    ]
+    lesson = LessonModel(
+        user_id=1, topic_id=1, sections=sections, generation=GenerationModel()
+    )
+    return jsonable_encoder(lesson, by_alias=True)
+
+
+def make_module_document(topic_count: int) -> dict:
+    module = ModuleModel(
+        module_number=1,
+        module_name="A module",
+        topics=[
+            TopicModel(id=topic_id, title="A topic")
+            for topic_id in range(1, topic_count + 1)
+        ],
+    )
+    return jsonable_encoder(module, by_alias=True)
+
+
+def compare(name: str, validate, construct, runs: int):
+    assert jsonable_encoder(validate()) == jsonable_encoder(construct())
+    validate_seconds: float = timeit.timeit(validate, number=runs)
+    construct_seconds: float = timeit.timeit(construct, number=runs)
+    print(
+        f"{name:<28} validate {validate_seconds / runs * 1e6:>8.1f}us"
+        f"  from_db {construct_seconds / runs * 1e6:>8.1f}us"
+        f"  {validate_seconds / construct_seconds:>5.1f}x faster"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sections", type=int, default=20)
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    lesson: dict = make_lesson_document(args.sections)
+    module: dict = make_module_document(args.topics)
+    compare(
+        f"lesson, {args.sections} sections",
+        lambda: LessonModel(**lesson),
+        lambda: LessonModel.from_db(lesson),
+        args.runs,
+    )
+    compare(
+        "lesson sections",
+        lambda: [SectionModel(**section) for section in lesson["sections"]],
+        lambda: [
+            construct_trusted(SectionModel, section) for section in lesson["sections"]
+        ],
+        args.runs,
+    )
+    compare(
+        f"module, {args.topics} topics",
+        lambda: ModuleModel(**module),
+        lambda: ModuleModel.from_db(module),
+        args.runs,
+    )
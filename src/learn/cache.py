@@ -0,0 +1,134 @@
+import hashlib
+import json
+
+from cachetools import TTLCache
+from fastapi.encoders import jsonable_encoder
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from src.config import settings
+from src.db.model import construct_trusted
+from src.learn.model import GenerationModel
+from src.learn.serializers import (
+    LessonContentModel,
+    ModuleModel,
+    SectionModel,
+    TopicModel,
+)
+from src.learn.utils import LESSON_CONTENT
+from src.openai.service import get_prompt_version
+
+# process wide LRU in front of the `LESSON_CONTENT` collection.
+# values are `(module_number, sections)` so a module can be invalidated.
+_lru: TTLCache = TTLCache(
+    maxsize=settings.LESSON_CACHE_SIZE,
+    ttl=settings.LESSON_CACHE_TTL,
+)
+
+
+class LessonContentCache:
+    """
+    Cache of generated lesson content.
+    The prompt is deterministic (`temperature=0`) and built only from the
+    module and topic, so every student reaching a topic can share one lesson.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase) -> None:
+        # reference to the learn database.
+        self.db = db
+
+    @staticmethod
+    def make_key(
+        module: ModuleModel,
+        topic: TopicModel,
+        prompt_version: str | None = None,
+    ) -> str:
+        """Hash the inputs of the topic's lesson prompt into a cache key."""
+        prompt_version = prompt_version or get_prompt_version(
+            module.module_number, topic.id
+        )
+        prompt_inputs = json.dumps(
+            [
+                module.module_number,
+                module.module_name,
+                topic.id,
+                topic.title,
+                prompt_version,
+            ]
+        )
+        return hashlib.sha256(prompt_inputs.encode()).hexdigest()
+
+    async def get(
+        self, module: ModuleModel, topic: TopicModel
+    ) -> list[SectionModel] | None:
+        key: str = self.make_key(module, topic)
+
+        cached = _lru.get(key)
+        if cached is not None:
+            return cached[1]
+
+        content: dict | None = await self.db[LESSON_CONTENT].find_one({"key": key})
+        if not content:
+            return None
+
+        sections = [
+            construct_trusted(SectionModel, section) for section in content["sections"]
+        ]
+        _lru[key] = (module.module_number, sections)
+        return sections
+
+    async def get_closest(
+        self, module: ModuleModel, topic: TopicModel
+    ) -> list[SectionModel] | None:
+        """Get the newest content of a topic generated by any prompt version."""
+        contents: list[dict] = (
+            await self.db[LESSON_CONTENT]
+            .find({"module_number": module.module_number, "topic_id": topic.id})
+            .sort("created_at", -1)
+            .to_list(1)
+        )
+        if not contents:
+            return None
+        return [
+            construct_trusted(SectionModel, section)
+            for section in contents[0]["sections"]
+        ]
+
+    async def set(
+        self,
+        module: ModuleModel,
+        topic: TopicModel,
+        sections: list[SectionModel],
+        generation: GenerationModel | None = None,
+    ):
+        key: str = self.make_key(module, topic)
+        content = LessonContentModel(
+            key=key,
+            module_id=module.id,
+            module_number=module.module_number,
+            topic_id=topic.id,
+            prompt_version=get_prompt_version(module.module_number, topic.id),
+            sections=sections,
+            generation=generation,
+        )
+
+        # first writer wins, concurrent generations of a topic are identical.
+        await self.db[LESSON_CONTENT].update_one(
+            {"key": key},
+            {"$setOnInsert": jsonable_encoder(content)},
+            upsert=True,
+        )
+        _lru[key] = (module.module_number, sections)
+
+    async def invalidate_module(self, module_number: int) -> int:
+        """Drop every cached lesson of a module.
+
+        Other workers drop their in-memory copy after `LESSON_CACHE_TTL`.
+        """
+        for key, (cached_module_number, _) in list(_lru.items()):
+            if cached_module_number == module_number:
+                _lru.pop(key, None)
+
+        result = await self.db[LESSON_CONTENT].delete_many(
+            {"module_number": module_number}
+        )
+        return result.deleted_count
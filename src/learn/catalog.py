@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from src.config import settings
+from src.learn.serializers import ModuleModel, TopicModel
+from src.learn.utils import META, MODULES
+
+# `META` document holding the catalog version.
+CATALOG_VERSION_ID = "module_catalog"
+
+
+class ModuleCatalog:
+    """
+    Process local copy of every module, indexed by `_id` and `module_number`.
+
+    Modules change rarely, only through the admin endpoints which bump a
+    version counter in mongodb. Each worker reads the counter at most once
+    every `MODULE_CATALOG_CHECK_SECONDS` and reloads the modules when it moved.
+    """
+
+    def __init__(self) -> None:
+        self.version: int | None = None
+        self.checked_at: float = 0
+        self.modules: list[ModuleModel] = []
+        self.by_id: dict[str, ModuleModel] = {}
+        self.by_number: dict[int, ModuleModel] = {}
+        # module id -> topic id -> topic
+        self.topics: dict[str, dict[int, TopicModel]] = {}
+        self.lock = asyncio.Lock()
+
+    async def refresh(self, db: AsyncIOMotorDatabase, force=False):
+        """Reload the modules if the catalog version changed."""
+        if not force and (
+            time.monotonic() - self.checked_at < settings.MODULE_CATALOG_CHECK_SECONDS
+        ):
+            return
+
+        async with self.lock:
+            version_doc: dict | None = await db[META].find_one(
+                {"_id": CATALOG_VERSION_ID}
+            )
+            version: int = version_doc["version"] if version_doc else 0
+            self.checked_at = time.monotonic()
+            if not force and version == self.version:
+                return
+
+            modules: list[dict] = (
+                await db[MODULES].find({}).sort("module_number").to_list(None)
+            )
+            self._load([ModuleModel.from_db(module) for module in modules])
+            self.version = version
+
+    def get_by_id(self, module_id: str) -> ModuleModel | None:
+        return self.by_id.get(module_id)
+
+    def get_by_number(self, module_number: int) -> ModuleModel | None:
+        return self.by_number.get(module_number)
+
+    def get_topic(self, module: ModuleModel, topic_id: int) -> TopicModel | None:
+        return self.topics.get(str(module.id), {}).get(topic_id)
+
+    @staticmethod
+    async def bump_version(db: AsyncIOMotorDatabase):
+        """Make every worker reload the catalog, call after changing a module."""
+        await db[META].update_one(
+            {"_id": CATALOG_VERSION_ID},
+            {"$inc": {"version": 1}},
+            upsert=True,
+        )
+
+    def _load(self, modules: list[ModuleModel]):
+        self.modules = modules
+        self.by_id = {str(module.id): module for module in modules}
+        self.by_number = {module.module_number: module for module in modules}
+        self.topics = {
+            str(module.id): {topic.id: topic for topic in module.topics}
+            for module in modules
+        }
+
+
+module_catalog = ModuleCatalog()
@@ -0,0 +1,34 @@
+from fastapi import HTTPException, status
+
+
+class ModuleNotFoundException(HTTPException):
+    def __init__(self, module: str | int):
+        super().__init__(
+            status.HTTP_404_NOT_FOUND,
+            f"module {module} not found.",
+        )
+
+
+class LessonNotFoundException(HTTPException):
+    def __init__(self, lesson_id: str):
+        super().__init__(
+            status.HTTP_404_NOT_FOUND,
+            f"lesson {lesson_id} not found.",
+        )
+
+
+class SectionNotFoundException(HTTPException):
+    def __init__(self, lesson_id: str, section_number: int):
+        super().__init__(
+            status.HTTP_404_NOT_FOUND,
+            f"section {section_number} of lesson {lesson_id} not found.",
+        )
+
+
+class OrganizationQuotaExceededException(HTTPException):
+    def __init__(self, organization_id: int):
+        super().__init__(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            f"organization {organization_id} has used its lesson generation quota,"
+            " only lessons generated before are available.",
+        )
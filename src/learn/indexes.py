@@ -0,0 +1,119 @@
+"""
+Indexes of the learn database and the queries they serve.
+
+    python -m src.learn.indexes          # create missing indexes
+    python -m src.learn.indexes --check  # fail if a query scans a collection
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from src.db.indexes import IndexRegistry
+from src.db.mongodb import db
+from src.db.mongodb_utils import close_mongo_connection, connect_to_mongo
+from src.learn.utils import (
+    EVOLVE_LEARNING,
+    LESSON_CONTENT,
+    LESSONS,
+    LLM_USAGE,
+    MODULES,
+    PROGRESS,
+)
+
+learn_indexes = IndexRegistry(EVOLVE_LEARNING)
+
+# lessons
+learn_indexes.add_index(LESSONS, [("user_id", 1), ("finished", 1), ("created_at", -1)])
+# `_id` breaks ties between lessons created at the same time in history pages.
+learn_indexes.add_index(LESSONS, [("user_id", 1), ("created_at", -1), ("_id", -1)])
+learn_indexes.add_query_shape(
+    "finished lessons", LESSONS, {"user_id": 1, "finished": True}
+)
+learn_indexes.add_query_shape(
+    "last lesson",
+    LESSONS,
+    {"user_id": 1},
+    sort=[("created_at", -1)],
+)
+learn_indexes.add_query_shape(
+    "lesson history page",
+    LESSONS,
+    {
+        "user_id": 1,
+        "$or": [
+            {"created_at": {"$lt": ""}},
+            {"created_at": "", "_id": {"$lt": ""}},
+        ],
+    },
+    sort=[("created_at", -1), ("_id", -1)],
+)
+learn_indexes.add_query_shape("lesson by id", LESSONS, {"_id": ""})
+learn_indexes.add_index(
+    LESSONS, [("module_id", 1), ("topic_id", 1), ("created_at", -1)]
+)
+learn_indexes.add_query_shape(
+    "latest lesson of topic",
+    LESSONS,
+    {"module_id": "", "topic_id": 1, "sections.0": {"$exists": True}},
+    sort=[("created_at", -1)],
+)
+
+# modules
+learn_indexes.add_index(MODULES, [("module_number", 1)], unique=True)
+learn_indexes.add_query_shape("module by number", MODULES, {"module_number": 1})
+learn_indexes.add_query_shape("module by id", MODULES, {"_id": ""})
+
+# progress
+learn_indexes.add_index(PROGRESS, [("user_id", 1)], unique=True)
+learn_indexes.add_query_shape("progress by user", PROGRESS, {"user_id": 1})
+
+# generated lesson content
+learn_indexes.add_index(LESSON_CONTENT, [("key", 1)], unique=True)
+learn_indexes.add_index(LESSON_CONTENT, [("module_number", 1), ("topic_id", 1)])
+learn_indexes.add_query_shape("content by key", LESSON_CONTENT, {"key": ""})
+learn_indexes.add_query_shape(
+    "content by module", LESSON_CONTENT, {"module_number": 1}
+)
+learn_indexes.add_query_shape(
+    "content by topic",
+    LESSON_CONTENT,
+    {"module_number": 1, "topic_id": 1},
+    sort=[("created_at", -1)],
+)
+
+
+# llm usage of organizations
+learn_indexes.add_index(LLM_USAGE, [("period", 1), ("start", 1), ("tokens", -1)])
+learn_indexes.add_query_shape(
+    "organization usage report",
+    LLM_USAGE,
+    {"period": "", "start": ""},
+    sort=[("tokens", -1)],
+)
+
+
+async def main(check: bool) -> int:
+    await connect_to_mongo()
+    try:
+        await learn_indexes.ensure_indexes(db.client)
+        if not check:
+            return 0
+
+        failed: list[str] = await learn_indexes.check_query_shapes(db.client)
+        for name in failed:
+            logging.error(f"db-index: query '{name}' scans the whole collection")
+        return 1 if failed else 0
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Manage learn database indexes.")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="explain every registered query and fail on a collection scan.",
+    )
+    sys.exit(asyncio.run(main(parser.parse_args().check)))
@@ -2,6 +2,8 @@ from enum import Enum
 
 from pydantic import BaseModel
 
+from src.openai.usage import LLMUsage
+
 
 class ContentType(str, Enum):
     HEADING = "HEADING"
@@ -10,6 +12,12 @@ class ContentType(str, Enum):
     UNORDERED_LIST = "UNORDERED_LIST"
 
 
+class LessonStatus(str, Enum):
+    # lesson is reserved for the student, its sections are being generated.
+    PENDING = "PENDING"
+    READY = "READY"
+
+
 class ContentBlockModel(BaseModel):
     type: ContentType
     text: str | None
@@ -22,3 +30,23 @@ class SectionModel(BaseModel):
     # ID is just for ordering of sections.
     id: int
     content: list[ContentBlockModel]
+
+
+class GenerationSource(str, Enum):
+    # sections were already in the content cache.
+    CACHE = "CACHE"
+    # sections were generated for this lesson.
+    LLM = "LLM"
+    # another request was generating the topic, its sections were reused.
+    SHARED = "SHARED"
+    # the LLM failed, sections come from an earlier lesson of the topic.
+    FALLBACK = "FALLBACK"
+
+
+class GenerationModel(LLMUsage):
+    """How the sections of a lesson were produced, and at what cost."""
+
+    source: GenerationSource = GenerationSource.CACHE
+    prompt_version: str | None = None
+    # seconds until the sections were available, LLM calls included.
+    latency_seconds: float = 0
@@ -0,0 +1,362 @@
+import json
+import logging
+import re
+
+from src.learn.model import ContentBlockModel, ContentType, SectionModel
+from src.metrics import metrics
+
+SECTIONS_KEY = '"sections"'
+# lessons with fewer sections are incomplete, see `create_prompt_text`.
+MIN_SECTIONS = 3
+MAX_SECTIONS = 5
+# cut points tried, from the end, when closing a truncated section.
+MAX_REPAIR_ATTEMPTS = 16
+
+# content blocks that did not match `ContentBlockModel` and were left out.
+dropped_blocks = metrics.counter("learn_parser_dropped_blocks_total")
+# sections left out, they had no valid content block.
+dropped_sections = metrics.counter("learn_parser_dropped_sections_total")
+# truncated sections that were closed and kept.
+repaired_sections = metrics.counter("learn_parser_repaired_sections_total")
+
+TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+class LessonParseError(ValueError):
+    """The LLM output holds no usable section."""
+
+
+def parse_lesson_sections(content: str) -> list[SectionModel]:
+    """Parse a complete LLM lesson output into its sections.
+
+    See `SectionStreamParser` for how noisy or truncated output is handled.
+    """
+    parser = SectionStreamParser()
+    parser.feed(content)
+    parser.finish()
+    sections: list[SectionModel] = parser.sections + (
+        [parser.repaired] if parser.repaired else []
+    )
+    if not sections:
+        raise LessonParseError("no valid section in the LLM output.")
+    return sections
+
+
+def parse_lesson_batch(content: str) -> dict[int, list[SectionModel]]:
+    """Parse a batched LLM output into the sections of each topic id.
+
+    Lessons with fewer than `MIN_SECTIONS` valid sections are left out,
+    e.g. the last one of a truncated output, their topics can be generated
+    again on their own.
+    """
+    try:
+        batch = loads_lenient(content)
+    except ValueError:
+        start: int = content.find("{")
+        batch = repair_truncated(content[start:]) if start != -1 else None
+    lessons = batch.get("lessons") if isinstance(batch, dict) else None
+
+    sections_by_topic: dict[int, list[SectionModel]] = {}
+    for lesson in lessons if isinstance(lessons, list) else []:
+        if not isinstance(lesson, dict) or not isinstance(
+            lesson.get("sections"), list
+        ):
+            continue
+        sections: list[SectionModel] = []
+        for section_data in lesson["sections"]:
+            section = validate_section(section_data, default_id=len(sections) + 1)
+            if section:
+                sections.append(section)
+        try:
+            topic_id = int(lesson.get("topic"))
+        except (TypeError, ValueError):
+            continue
+        if len(sections) < MIN_SECTIONS:
+            logging.warning(f"learn-parser: skipped the incomplete lesson {topic_id}")
+            continue
+        sections_by_topic[topic_id] = sections
+
+    return sections_by_topic
+
+
+def append_missing_sections(
+    sections: list[SectionModel], missing_sections: list[SectionModel]
+) -> list[SectionModel]:
+    """Number the sections asked for after a cut off lesson on from its last
+    section and add them, up to `MAX_SECTIONS` in all. Returns those added.
+    """
+    room: int = max(0, MAX_SECTIONS - len(sections))
+    added: list[SectionModel] = missing_sections[:room]
+    for section in added:
+        section.id = sections[-1].id + 1
+        sections.append(section)
+    return added
+
+
+def validate_block(block) -> ContentBlockModel | None:
+    """Build a content block, None if it does not fit its `ContentType`."""
+    if not isinstance(block, dict):
+        return None
+
+    try:
+        block_type = ContentType(str(block.get("type", "")).strip().upper())
+    except ValueError:
+        return None
+
+    if block_type in (ContentType.HEADING, ContentType.PARAGRAPH):
+        text = block.get("text")
+        if not isinstance(text, str) or not text.strip():
+            return None
+        return ContentBlockModel(type=block_type, text=text)
+
+    items = block.get("items")
+    if not isinstance(items, list):
+        return None
+    items = [str(item) for item in items if isinstance(item, (str, int, float))]
+    items = [item for item in items if item.strip()]
+    if not items:
+        return None
+    return ContentBlockModel(type=block_type, items=items)
+
+
+def validate_section(data, default_id: int) -> SectionModel | None:
+    """Build a section from its valid content blocks, None if it has none."""
+    if not isinstance(data, dict) or not isinstance(data.get("content"), list):
+        return None
+
+    content: list[ContentBlockModel] = []
+    for block in data["content"]:
+        block_model: ContentBlockModel | None = validate_block(block)
+        if block_model:
+            content.append(block_model)
+        else:
+            dropped_blocks.inc()
+    if not content:
+        return None
+
+    section_id = data.get("id")
+    if not isinstance(section_id, int) or isinstance(section_id, bool):
+        section_id = default_id
+    return SectionModel(id=section_id, content=content)
+
+
+def loads_lenient(text: str):
+    """`json.loads` that tolerates `//` comments and trailing commas, both
+    are copied from the prompt's example by the model now and then.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    cleaned: list[str] = []
+    in_string = escaped = False
+    position = 0
+    while position < len(text):
+        char: str = text[position]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif text.startswith("//", position):
+            position = text.find("\n", position)
+            if position == -1:
+                break
+            continue
+        cleaned.append(char)
+        position += 1
+
+    return json.loads(TRAILING_COMMA.sub(r"\1", "".join(cleaned)))
+
+
+def close_json(text: str) -> str | None:
+    """Close the brackets left open by `text`, None if it ends inside a
+    string or right after a key, where a value would have to be invented.
+    """
+    openers: list[str] = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            openers.append(char)
+        elif char in "}]":
+            if not openers:
+                return None
+            openers.pop()
+
+    stripped: str = text.rstrip()
+    if in_string or stripped.endswith(":"):
+        return None
+    closers: str = "".join(
+        "}" if opener == "{" else "]" for opener in reversed(openers)
+    )
+    return stripped.rstrip(",") + closers
+
+
+def repair_truncated(text: str):
+    """Parse JSON cut off mid-way, dropping the incomplete trailing value.
+
+    Tries the text as is, then cuts before each of the last commas, so a
+    block whose text was cut off is left out rather than kept half written.
+    """
+    cut_points: list[int] = [len(text)]
+    comma: int = len(text)
+    while len(cut_points) < MAX_REPAIR_ATTEMPTS:
+        comma = text.rfind(",", 0, comma)
+        if comma == -1:
+            break
+        cut_points.append(comma)
+
+    for cut_point in cut_points:
+        closed: str | None = close_json(text[:cut_point])
+        if closed is None:
+            continue
+        try:
+            return loads_lenient(closed)
+        except ValueError:
+            continue
+    return None
+
+
+class SectionStreamParser:
+    """
+    Incrementally parse the `sections` array of a streamed LLM lesson.
+
+    Text is fed as it arrives, every section object is returned by `feed`
+    as soon as its closing brace is seen, so it can be sent to the client
+    before the completion has finished.
+
+    Text around the array is ignored. Sections are validated block by block,
+    invalid blocks are dropped. `finish` closes a section that was cut off
+    into `repaired`, which is kept apart as it may be missing blocks.
+    """
+
+    def __init__(self) -> None:
+        self.buffer: str = ""
+        # index of the next character of `buffer` to scan.
+        self.position: int = 0
+        self.in_array: bool = False
+        self.finished: bool = False
+        self.depth: int = 0
+        self.in_string: bool = False
+        self.escaped: bool = False
+        self.object_start: int = 0
+        self.sections: list[SectionModel] = []
+        self.repaired: SectionModel | None = None
+
+    @property
+    def truncated(self) -> bool:
+        """The output ended before the `sections` array was closed."""
+        return not self.finished
+
+    @property
+    def incomplete(self) -> bool:
+        """Sections are missing, the rest of the lesson should be asked for."""
+        return self.truncated or len(self.sections) < MIN_SECTIONS
+
+    def feed(self, text: str) -> list[SectionModel]:
+        """Add streamed text and return the sections completed by it."""
+        self.buffer += text
+        new_sections: list[SectionModel] = []
+
+        if not self.in_array and not self._find_array_start():
+            return new_sections
+
+        while not self.finished and self.position < len(self.buffer):
+            char: str = self.buffer[self.position]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.depth == 0:
+                    self.object_start = self.position
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    section_text = self.buffer[self.object_start : self.position + 1]
+                    try:
+                        section_data = loads_lenient(section_text)
+                    except ValueError:
+                        section_data = None
+                    section: SectionModel | None = self._add_section(section_data)
+                    if section:
+                        new_sections.append(section)
+            elif char == "]" and self.depth == 0:
+                self.finished = True
+
+            self.position += 1
+
+        return new_sections
+
+    def finish(self) -> list[SectionModel]:
+        """Call once the output is complete, returns the sections found only
+        now, in an output without a `sections` key.
+        """
+        if not self.in_array:
+            # no `sections` key, accept a bare array of sections.
+            array_index: int = self.buffer.find("[")
+            if array_index == -1:
+                return []
+            self.position = array_index + 1
+            self.in_array = True
+            new_sections: list[SectionModel] = self.feed("")
+            return new_sections + self.finish()
+
+        if self.finished or self.depth == 0:
+            return []
+
+        self.depth = 0
+        self.repaired = validate_section(
+            repair_truncated(self.buffer[self.object_start :]),
+            default_id=len(self.sections) + 1,
+        )
+        if self.repaired:
+            repaired_sections.inc()
+        return []
+
+    def _add_section(self, section_data) -> SectionModel | None:
+        section: SectionModel | None = validate_section(
+            section_data, default_id=len(self.sections) + 1
+        )
+        if not section:
+            dropped_sections.inc()
+            return None
+        self.sections.append(section)
+        return section
+
+    def _find_array_start(self) -> bool:
+        key_index: int = self.buffer.find(SECTIONS_KEY, self.position)
+        if key_index == -1:
+            # keep a possibly incomplete key for the next chunk.
+            self.position = max(self.position, len(self.buffer) - len(SECTIONS_KEY))
+            return False
+
+        array_index: int = self.buffer.find("[", key_index + len(SECTIONS_KEY))
+        if array_index == -1:
+            self.position = key_index
+            return False
+
+        self.position = array_index + 1
+        self.in_array = True
+        return True
@@ -0,0 +1,118 @@
+from datetime import datetime
+from enum import Enum
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from src.config import settings
+from src.db.model import datetime_now
+from src.learn.utils import LLM_USAGE
+from src.openai.usage import LLMUsage
+
+
+class UsagePeriod(str, Enum):
+    DAY = "day"
+    MONTH = "month"
+
+
+def get_period_start(period: UsagePeriod, now: datetime) -> str:
+    """Key of the day or month `now` is in, e.g. `2024-05-31` or `2024-05`."""
+    if period == UsagePeriod.DAY:
+        return now.strftime("%Y-%m-%d")
+    return now.strftime("%Y-%m")
+
+
+class OrganizationUsage:
+    """
+    LLM usage of each organization's students, per day and per month.
+
+    One `LLM_USAGE` document per organization and period is incremented by
+    every generation. Quotas are checked before a generation and usage is
+    recorded after it, so concurrent generations may overshoot a quota by a
+    few lessons.
+    """
+
+    # tokens allowed per period, 0 is unlimited.
+    QUOTAS: dict[UsagePeriod, int] = {
+        UsagePeriod.DAY: settings.ORG_DAILY_TOKEN_QUOTA,
+        UsagePeriod.MONTH: settings.ORG_MONTHLY_TOKEN_QUOTA,
+    }
+
+    def __init__(self, db: AsyncIOMotorDatabase) -> None:
+        # reference to the learn database.
+        self.db = db
+
+    @staticmethod
+    def _usage_id(organization_id: int, period: UsagePeriod, start: str) -> str:
+        return f"{organization_id}:{period.value}:{start}"
+
+    async def record(self, organization_id: int, usage: LLMUsage):
+        """Add the usage of a generation to the organization's periods."""
+        if not usage.llm_calls:
+            return
+
+        now: datetime = datetime_now()
+        periods: list[tuple[UsagePeriod, str]] = [
+            (period, get_period_start(period, now)) for period in UsagePeriod
+        ]
+        await self.db[LLM_USAGE].bulk_write(
+            [
+                UpdateOne(
+                    {"_id": self._usage_id(organization_id, period, start)},
+                    {
+                        "$setOnInsert": {
+                            "organization_id": organization_id,
+                            "period": period.value,
+                            "start": start,
+                        },
+                        "$inc": {
+                            "lessons": 1,
+                            "llm_calls": usage.llm_calls,
+                            "prompt_tokens": usage.prompt_tokens,
+                            "completion_tokens": usage.completion_tokens,
+                            "tokens": usage.prompt_tokens + usage.completion_tokens,
+                            "cost_usd": usage.cost_usd,
+                        },
+                        "$set": {"updated_at": now.isoformat()},
+                    },
+                    upsert=True,
+                )
+                for period, start in periods
+            ],
+            ordered=False,
+        )
+
+    async def is_exceeded(self, organization_id: int) -> bool:
+        """Whether the organization has used its daily or monthly tokens."""
+        now: datetime = datetime_now()
+        # usage document id -> quota of its period.
+        quotas: dict[str, int] = {
+            self._usage_id(
+                organization_id, period, get_period_start(period, now)
+            ): quota
+            for period, quota in self.QUOTAS.items()
+            if quota
+        }
+        if not quotas:
+            return False
+
+        async for usage in self.db[LLM_USAGE].find(
+            {"_id": {"$in": list(quotas)}}, {"tokens": 1}
+        ):
+            if usage["tokens"] >= quotas[usage["_id"]]:
+                return True
+        return False
+
+    async def get_report(self, period: UsagePeriod, start: str) -> list[dict]:
+        """Usage of every organization in a period, heaviest first."""
+        report: list[dict] = (
+            await self.db[LLM_USAGE]
+            .find({"period": period.value, "start": start}, {"_id": 0})
+            .sort("tokens", -1)
+            .to_list(None)
+        )
+        quota: int = self.QUOTAS[period]
+        for usage in report:
+            usage["quota"] = quota or None
+            usage["exceeded"] = bool(quota) and usage["tokens"] >= quota
+        return report
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import JSONResponse
+from typing import Literal
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Path, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import DuplicateKeyError
 
 from src.auth.utils import get_current_admin
 from src.db.mongodb import get_database
+from src.learn.quota import UsagePeriod
 from src.learn.serializers import LessonModelRequest, ModuleModel
 from src.learn.service import LearnService
-from src.learn.utils import EVOLVE_LEARNING, MODULES
 from src.students.utils import get_current_student
 
 router = APIRouter(
@@ -37,11 +40,8 @@ async def create_new_lesson(
     user: dict = Depends(get_current_student),
     db: AsyncIOMotorClient = Depends(get_database),
 ):
-    learn_service = LearnService(db=db)
-    new_lesson = await learn_service.create_lesson(
-        user_id=user["id"],
-        req=create_req,
-    )
+    learn_service = LearnService(db=db, organization_id=user["organization_id"])
+    new_lesson = await learn_service.create_lesson(user_id=user["id"])
     return new_lesson
 
 
@@ -50,30 +50,140 @@ async def get_modules(
     _=Depends(get_current_admin),
     db: AsyncIOMotorClient = Depends(get_database),
 ):
-    return await db[EVOLVE_LEARNING][MODULES].find({}).to_list(100)
+    return await LearnService(db=db).get_modules()
 
 
 @router.get("/lesson")
 async def get_lesson(
+    outline: bool = Query(
+        default=False,
+        description="only return the id and heading of each section, see"
+        " `/lesson/{lesson_id}/section/{section_number}`.",
+    ),
     user: dict = Depends(get_current_student),
     db: AsyncIOMotorClient = Depends(get_database),
 ):
-    learn_service = LearnService(db=db)
+    learn_service = LearnService(db=db, organization_id=user["organization_id"])
     current_lesson = await learn_service.get_current_lesson(user_id=user["id"])
 
     if not current_lesson:
         return {"msg": "No lessons found"}
 
+    if outline:
+        return learn_service.get_lesson_outline(jsonable_encoder(current_lesson))
     return current_lesson
 
 
+@router.get("/lesson/{lesson_id}/section/{section_number}")
+async def get_lesson_section(
+    lesson_id: str,
+    section_number: int = Path(ge=1),
+    user: dict = Depends(get_current_student),
+    db: AsyncIOMotorClient = Depends(get_database),
+):
+    return await LearnService(db=db).get_lesson_section(
+        user_id=user["id"], lesson_id=lesson_id, section_number=section_number
+    )
+
+
+@router.get("/lessons")
+async def get_lessons(
+    cursor: str | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    full: bool = False,
+    user: dict = Depends(get_current_student),
+    db: AsyncIOMotorClient = Depends(get_database),
+):
+    return await LearnService(db=db).get_lessons(
+        user_id=user["id"], cursor=cursor, limit=limit, full=full
+    )
+
+
+@router.get("/lessons/user/{user_id}")
+async def get_user_lessons(
+    user_id: int,
+    cursor: str | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    full: bool = False,
+    _=Depends(get_current_admin),
+    db: AsyncIOMotorClient = Depends(get_database),
+):
+    return await LearnService(db=db).get_lessons(
+        user_id=user_id, cursor=cursor, limit=limit, full=full
+    )
+
+
+@router.get("/lesson/stream")
+async def stream_lesson(
+    user: dict = Depends(get_current_student),
+    db: AsyncIOMotorClient = Depends(get_database),
+):
+    learn_service = LearnService(db=db, organization_id=user["organization_id"])
+    return StreamingResponse(
+        learn_service.stream_current_lesson(user_id=user["id"]),
+        media_type="text/event-stream",
+        # stop proxies from buffering the events.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/lesson/finish")
 async def finish_lesson(
+    background_tasks: BackgroundTasks,
     user: dict = Depends(get_current_student),
     db: AsyncIOMotorClient = Depends(get_database),
 ):
-    finished_lesson_id = await LearnService(db=db).finish_lesson(user["id"])
+    learn_service = LearnService(db=db, organization_id=user["organization_id"])
+    finished_lesson_id = await learn_service.finish_lesson(user["id"])
     if not finished_lesson_id:
         return {"msg": "No pending lessons."}
 
+    # generate the next lesson while the student is away.
+    pending_lesson: dict | None = await learn_service.create_pending_lesson(
+        user["id"]
+    )
+    if pending_lesson:
+        background_tasks.add_task(learn_service.prefetch_lesson, pending_lesson)
+
     return {"msg": f"marked lesson with id {finished_lesson_id} as finished."}
+
+
+@router.get("/generation/report")
+async def get_generation_report(
+    sort_by: Literal["cost_usd", "latency_seconds", "lessons"] = "cost_usd",
+    limit: int = Query(default=20, ge=1, le=500),
+    _=Depends(get_current_admin),
+    db: AsyncIOMotorClient = Depends(get_database),
+):
+    return await LearnService(db=db).get_generation_report(
+        sort_by=sort_by, limit=limit
+    )
+
+
+@router.get("/usage/organizations")
+async def get_organization_usage(
+    period: UsagePeriod = UsagePeriod.DAY,
+    start: str | None = Query(
+        default=None,
+        description="day as `YYYY-MM-DD` or month as `YYYY-MM`, the current one"
+        " by default.",
+    ),
+    _=Depends(get_current_admin),
+    db: AsyncIOMotorClient = Depends(get_database),
+):
+    return await LearnService(db=db).get_organization_usage(period=period, start=start)
+
+
+@router.delete("/cache/module/{module_number}")
+async def invalidate_module_cache(
+    module_number: int,
+    _=Depends(get_current_admin),
+    db: AsyncIOMotorClient = Depends(get_database),
+):
+    deleted_count: int = await LearnService(db=db).invalidate_module_lessons(
+        module_number
+    )
+    return {
+        "msg": f"invalidated cached lessons of module {module_number}.",
+        "deleted": deleted_count,
+    }
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field
 
 from src.db.model import PyObjectId, RWModel
-from src.learn.model import SectionModel
+from src.learn.model import GenerationModel, LessonStatus, SectionModel
 
 
 class TopicModel(BaseModel):
@@ -37,6 +37,44 @@ class LessonModel(RWModel):
     topic_id: int
     sections: list[SectionModel]
     finished: bool = Field(default=False)
+    status: LessonStatus = Field(default=LessonStatus.READY)
+    # created ahead of time when the previous lesson was finished.
+    prefetched: bool = Field(default=False)
+    # the student asked for the prefetched lesson, counted once.
+    opened: bool = Field(default=False)
+    # set once the sections are generated.
+    generation: GenerationModel | None = None
+
+
+class ProgressModel(RWModel):
+    """
+    Where a student is in the course, one document per student.
+    `lesson_id` is the ongoing lesson, None once it is finished.
+    """
+
+    user_id: int
+    module_id: PyObjectId = Field(default_factory=PyObjectId)
+    module_number: int
+    topic_id: int
+    lesson_id: str | None
+    lessons_created: int = Field(default=0)
+    lessons_finished: int = Field(default=0)
+
+
+class LessonContentModel(RWModel):
+    """
+    Generated sections of a module topic, shared by every student's lesson.
+    `key` is a hash of the prompt inputs, see `LessonContentCache.make_key`.
+    """
+
+    key: str
+    module_id: PyObjectId = Field(default_factory=PyObjectId)
+    module_number: int
+    topic_id: int
+    prompt_version: str
+    sections: list[SectionModel]
+    # the LLM calls that generated the sections.
+    generation: GenerationModel | None = None
 
 
 class LessonModelRequest(BaseModel):
@@ -1,99 +1,242 @@
-import json
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Callable
 
 from fastapi import status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import HTTPException
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 
-from src.learn.serializers import LessonModel, ModuleModel, SectionModel, TopicModel
-from src.learn.utils import EVOLVE_LEARNING, LESSONS, MODULES
-from src.openai.service import OpenAIService
+from src.config import settings
+from src.db.model import construct_trusted, datetime_now
+from src.learn.cache import LessonContentCache
+from src.learn.catalog import module_catalog
+from src.learn.exceptions import (
+    LessonNotFoundException,
+    ModuleNotFoundException,
+    OrganizationQuotaExceededException,
+    SectionNotFoundException,
+)
+from src.learn.model import (
+    ContentType,
+    GenerationModel,
+    GenerationSource,
+    LessonStatus,
+)
+from src.learn.parser import (
+    MAX_SECTIONS,
+    LessonParseError,
+    SectionStreamParser,
+    append_missing_sections,
+    parse_lesson_batch,
+    parse_lesson_sections,
+)
+from src.learn.quota import OrganizationUsage, UsagePeriod, get_period_start
+from src.learn.singleflight import SingleFlight
+from src.learn.serializers import (
+    LessonModel,
+    ModuleModel,
+    ProgressModel,
+    SectionModel,
+    TopicModel,
+)
+from src.learn.utils import EVOLVE_LEARNING, LESSONS, MODULES, PROGRESS, sse_event
+from src.metrics import metrics
+from src.openai.exceptions import (
+    LLMServiceException,
+    LLMTimeoutException,
+    LLMUnavailableException,
+)
+from src.openai.scheduler import Priority
+from src.openai.service import (
+    OpenAIService,
+    get_prompt_version,
+    record_prompt_parse,
+)
+from src.openai.usage import LLMUsage
+from src.utils import decode_cursor, encode_cursor
+
+# a prefetched lesson was ready when the student first asked for it.
+prefetch_hits = metrics.counter("learn_prefetch_hits_total")
+# the student first asked for a prefetched lesson while it was still pending.
+prefetch_misses = metrics.counter("learn_prefetch_misses_total")
+metrics.gauge(
+    "learn_prefetch_hit_rate",
+    lambda: prefetch_hits.value / ((prefetch_hits.value + prefetch_misses.value) or 1),
+)
+
+# an LLM failure was answered with a previously generated lesson.
+lesson_fallbacks = metrics.counter("learn_lesson_fallbacks_total")
+# an LLM failure found no previously generated lesson to fall back to.
+lesson_fallback_misses = metrics.counter("learn_lesson_fallback_misses_total")
+
+# a cut off lesson was completed by asking for its missing sections.
+lesson_reasks = metrics.counter("learn_lesson_reasks_total")
+
+# lessons by where their sections came from, the cache hit rate is
+# `CACHE / (CACHE + LLM + SHARED)`.
+lesson_sources = {
+    source: metrics.counter(f"learn_lesson_sections_{source.value.lower()}_total")
+    for source in GenerationSource
+}
+# lessons of organizations past their quota served from earlier content.
+quota_fallbacks = metrics.counter("learn_lesson_quota_fallbacks_total")
+
+# seconds until a lesson's sections were available.
+lesson_latency = metrics.histogram("learn_lesson_sections_seconds")
+
+# lesson history fields, the sections are reduced to their headings.
+LESSON_SUMMARY_PROJECTION = {
+    "module_id": 1,
+    "topic_id": 1,
+    "finished": 1,
+    "status": 1,
+    "created_at": 1,
+    "headings": {
+        "$map": {
+            "input": "$sections",
+            "as": "section",
+            "in": {
+                "$arrayElemAt": [
+                    {
+                        "$map": {
+                            "input": {
+                                "$filter": {
+                                    "input": "$$section.content",
+                                    "as": "block",
+                                    "cond": {"$eq": ["$$block.type", "HEADING"]},
+                                }
+                            },
+                            "as": "block",
+                            "in": "$$block.text",
+                        }
+                    },
+                    0,
+                ]
+            },
+        }
+    },
+}
+
+# receives each section of a lesson as soon as it is available.
+SectionCallback = Callable[[SectionModel], None]
 
 
 class LearnService:
-    def __init__(self, db: AsyncIOMotorClient) -> None:
+    def __init__(
+        self, db: AsyncIOMotorClient, organization_id: int | None = None
+    ) -> None:
         # reference to the learn database.
         self.db = db[EVOLVE_LEARNING]
-        # number of lessons that a `find` query should buffer in a list.
-        self.max_lessons = 10
+        self.content_cache = LessonContentCache(self.db)
+        self.single_flight = SingleFlight(self.db)
+        # organization charged with the LLM usage, None for platform work
+        # such as warm-up, which has no quota.
+        self.organization_id = organization_id
+        self.organization_usage = OrganizationUsage(self.db)
 
     async def get_current_lesson(self, user_id: int):
         """Get the last ongoing lesson, if any or create a new one."""
-        ongoing_lessons: list[LessonModel] = (
-            await self.db[LESSONS]
-            .find(
-                filter={
-                    "finished": False,
-                    "user_id": user_id,
-                },
-                sort=[("created_at", -1)],
-            )
-            .to_list(self.max_lessons)
-        )
+        ongoing_lesson: dict | None = await self._find_ongoing_lesson(user_id)
 
-        if ongoing_lessons and len(ongoing_lessons) > 0:
-            return ongoing_lessons[0]
+        if ongoing_lesson and ongoing_lesson.get("status") != LessonStatus.PENDING:
+            await self._record_prefetch_open(ongoing_lesson)
+            return ongoing_lesson
 
-        print("no ongoing lessons, creating new lesson....")
-        ongoing_lessons = await self.create_lesson(user_id=user_id)
-        return ongoing_lessons
+        if ongoing_lesson:
+            await self._record_prefetch_open(ongoing_lesson)
+        else:
+            logging.debug(f"learn-lesson: no ongoing lesson for user {user_id}")
+        return await self.create_lesson(user_id=user_id)
 
     async def create_lesson(
         self,
         user_id: int,
     ) -> LessonModel:
-        last_lesson: list[LessonModel] = (
-            await self.db[LESSONS]
-            .find(
-                filter={"user_id": user_id},
-                sort=[("created_at", -1)],
-            )
-            .to_list(1)
+        """Create the student's next lesson. Concurrent calls for a student,
+        from any worker, share a single generation.
+        """
+        return await self.single_flight.run(
+            key=self._lesson_key(user_id),
+            call=lambda: self._create_lesson(user_id),
+            read_result=lambda: self._find_ready_lesson(user_id),
         )
 
-        if last_lesson and len(last_lesson) > 0:
-            last_lesson: LessonModel = LessonModel(**last_lesson[0])
+    async def stream_current_lesson(self, user_id: int) -> AsyncIterator[str]:
+        """Stream the current lesson as server sent events.
+
+        A `section` event is sent for each section as soon as it has been
+        generated, followed by a `lesson` event with the persisted lesson.
+        """
+        ongoing_lesson: dict | None = await self._find_ongoing_lesson(user_id)
+        emitted_section_ids: set[int] = set()
+
+        if ongoing_lesson:
+            await self._record_prefetch_open(ongoing_lesson)
+        if ongoing_lesson and ongoing_lesson.get("status") != LessonStatus.PENDING:
+            lesson = ongoing_lesson
         else:
-            first_module: ModuleModel = ModuleModel(
-                **(
-                    await self.db[MODULES].find_one(
-                        {"module_number": 1},
+
+            sections: asyncio.Queue = asyncio.Queue()
+
+            async def create_lesson():
+                try:
+                    return await self.single_flight.run(
+                        key=self._lesson_key(user_id),
+                        call=lambda: self._create_lesson(
+                            user_id, on_section=sections.put_nowait
+                        ),
+                        read_result=lambda: self._find_ready_lesson(user_id),
                     )
-                )
-            )
-            # create a first topic if one does not exist.
-            first_topic: TopicModel | None = None
-            if len(first_module.topics) == 0:
-                first_topic = TopicModel(id=1, title=first_module.module_name)
-            else:
-                first_topic: dict | TopicModel = first_module.topics[0]
-                first_topic: TopicModel = (
-                    TopicModel(**first_topic)
-                    if isinstance(first_topic, dict)
-                    else TopicModel(**first_topic.dict())
-                )
+                finally:
+                    sections.put_nowait(None)
 
-            sections: list[SectionModel] = self._create_lesson_gpt(
-                topic=first_topic,
-                module=first_module,
-            )
+            # a task, so the lesson is still persisted if the client leaves.
+            creation: asyncio.Task = asyncio.ensure_future(create_lesson())
+            while (section := await sections.get()) is not None:
+                emitted_section_ids.add(section.id)
+                yield sse_event("section", section)
 
-            lesson_model = LessonModel(
+            try:
+                lesson = await creation
+            except HTTPException as e:
+                yield sse_event("error", {"detail": e.detail})
+                return
+
+        lesson = jsonable_encoder(lesson, by_alias=True)
+        for section in lesson["sections"]:
+            if section["id"] not in emitted_section_ids:
+                yield sse_event("section", section)
+        yield sse_event("lesson", lesson)
+
+    async def _create_lesson(
+        self,
+        user_id: int,
+        on_section: SectionCallback | None = None,
+    ) -> dict:
+        progress: dict | None = await self._get_progress(user_id)
+
+        if not progress:
+            first_module, first_topic = await self._first_module_topic()
+            return await self._insert_lesson(
                 user_id=user_id,
-                sections=sections,
-                topic_id=first_topic.id,
-                module_id=first_module.id,
+                module=first_module,
+                topic=first_topic,
+                on_section=on_section,
             )
 
-            lesson = jsonable_encoder(lesson_model)
-            new_lesson = await self.db[LESSONS].insert_one(lesson)
-            created_lesson: LessonModel = await self.db[LESSONS].find_one(
-                {"_id": new_lesson.inserted_id}
+        if progress.get("lesson_id"):
+            ongoing_lesson: dict | None = await self.db[LESSONS].find_one(
+                {"_id": progress["lesson_id"]}
             )
-            return created_lesson
-
-        if not last_lesson.finished:
-            return last_lesson
+            if ongoing_lesson and ongoing_lesson.get("status") == LessonStatus.PENDING:
+                return await self._fill_pending_lesson(
+                    ongoing_lesson, on_section=on_section
+                )
+            if ongoing_lesson:
+                return ongoing_lesson
 
         """
         Module:
@@ -102,24 +245,628 @@ class LearnService:
 
         Generate the next lesson
         """
-        print("Last Lesson", last_lesson.module_id)
-        current_module: dict = await self.db[MODULES].find_one(
-            {"_id": str(last_lesson.module_id)},
+        logging.debug(
+            f"learn-lesson: user {user_id} last lesson was module"
+            f" {progress['module_id']} topic {progress['topic_id']}"
+        )
+        next_module, next_topic = await self._next_module_topic(
+            module_id=progress["module_id"],
+            topic_id=progress["topic_id"],
+        )
+        return await self._insert_lesson(
+            user_id=user_id,
+            module=next_module,
+            topic=next_topic,
+            on_section=on_section,
+        )
+
+    async def get_lessons(
+        self,
+        user_id: int,
+        cursor: str | None = None,
+        limit: int = 20,
+        full: bool = False,
+    ) -> dict:
+        """Get a page of the student's lessons, newest first.
+
+        Pages are keyed by `(created_at, _id)` of their last lesson, so every
+        page is fetched from the index at the same cost. Only a summary of
+        each lesson is returned unless `full` is set.
+        """
+        query: dict = {"user_id": user_id}
+        if cursor:
+            created_at, lesson_id = decode_cursor(cursor, size=2)
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": lesson_id}},
+            ]
+
+        pipeline: list[dict] = [
+            {"$match": query},
+            {"$sort": {"created_at": -1, "_id": -1}},
+            # one more lesson tells whether there is a next page.
+            {"$limit": limit + 1},
+        ]
+        if not full:
+            pipeline.append({"$project": LESSON_SUMMARY_PROJECTION})
+        lessons: list[dict] = await self.db[LESSONS].aggregate(pipeline).to_list(None)
+
+        next_cursor: str | None = None
+        if len(lessons) > limit:
+            lessons = lessons[:limit]
+            next_cursor = encode_cursor([lessons[-1]["created_at"], lessons[-1]["_id"]])
+
+        await module_catalog.refresh(self.db)
+        for lesson in lessons:
+            module: ModuleModel | None = module_catalog.get_by_id(
+                str(lesson["module_id"])
+            )
+            topic: TopicModel | None = (
+                module_catalog.get_topic(module, lesson["topic_id"]) if module else None
+            )
+            lesson["module_number"] = module.module_number if module else None
+            lesson["topic_title"] = topic.title if topic else None
+        return {"lessons": lessons, "next_cursor": next_cursor}
+
+    async def get_lesson_section(
+        self, user_id: int, lesson_id: str, section_number: int
+    ) -> dict:
+        """Get the `section_number`th section of a student's lesson, from 1,
+        without reading the other sections from mongodb.
+        """
+        lesson: dict | None = await self.db[LESSONS].find_one(
+            {"_id": lesson_id, "user_id": user_id},
+            {"_id": 1, "sections": {"$slice": [section_number - 1, 1]}},
+        )
+        if not lesson:
+            raise LessonNotFoundException(lesson_id)
+        if not lesson.get("sections"):
+            raise SectionNotFoundException(lesson_id, section_number)
+        return lesson["sections"][0]
+
+    @staticmethod
+    def get_lesson_outline(lesson: dict) -> dict:
+        """Replace the sections of a lesson by their ids and headings, the
+        sections are then fetched one at a time with `get_lesson_section`.
+        """
+        outline: list[dict] = []
+        for section in lesson["sections"]:
+            heading: dict | None = next(
+                (
+                    block
+                    for block in section["content"]
+                    if block["type"] == ContentType.HEADING
+                ),
+                None,
+            )
+            outline.append(
+                {"id": section["id"], "heading": heading["text"] if heading else None}
+            )
+        return {**lesson, "sections": outline}
+
+    async def create_new_module(self, req: ModuleModel) -> ModuleModel:
+        module = jsonable_encoder(req)
+        await self.db[MODULES].insert_one(module)
+        await module_catalog.bump_version(self.db)
+        await module_catalog.refresh(self.db, force=True)
+        return module
+
+    async def get_modules(self) -> list[ModuleModel]:
+        await module_catalog.refresh(self.db)
+        return module_catalog.modules
+
+    async def finish_lesson(self, user_id: int) -> str | None:
+        """Mark the ongoing lesson as finished, returns its id if any."""
+        progress: dict | None = await self._get_progress(user_id)
+        if not progress or not progress.get("lesson_id"):
+            return None
+
+        # matching the lesson id makes concurrent finish calls count once.
+        progress = await self.db[PROGRESS].find_one_and_update(
+            {"user_id": user_id, "lesson_id": progress["lesson_id"]},
+            {
+                "$set": {"lesson_id": None, "updated_at": self._now()},
+                "$inc": {"lessons_finished": 1},
+            },
+        )
+        if not progress:
+            return None
+
+        await self.db[LESSONS].update_one(
+            {"_id": progress["lesson_id"]},
+            {"$set": {"finished": True}},
+        )
+        return progress["lesson_id"]
+
+    async def create_pending_lesson(self, user_id: int) -> dict | None:
+        """Reserve the student's next lesson, its sections are filled by
+        `prefetch_lesson`, so call it right after `finish_lesson`.
+
+        Returns None when prefetching is disabled, the student has an ongoing
+        lesson or every module is finished. The lesson is reserved under the
+        student's lesson key, so it is skipped while a lesson is being created
+        for them.
+        """
+        if settings.LESSON_PREFETCH_DEPTH < 1:
+            return None
+        return await self.single_flight.run_if_idle(
+            key=self._lesson_key(user_id),
+            call=lambda: self._create_pending_lesson(user_id),
+        )
+
+    async def _create_pending_lesson(self, user_id: int) -> dict | None:
+        progress: dict | None = await self._get_progress(user_id)
+        if not progress or progress.get("lesson_id"):
+            return None
+
+        try:
+            next_module, next_topic = await self._next_module_topic(
+                module_id=progress["module_id"],
+                topic_id=progress["topic_id"],
+            )
+        except HTTPException:
+            return None
+
+        lesson_model = LessonModel(
+            user_id=user_id,
+            sections=[],
+            topic_id=next_topic.id,
+            module_id=next_module.id,
+            status=LessonStatus.PENDING,
+            prefetched=True,
+        )
+        lesson = jsonable_encoder(lesson_model)
+        await self.db[LESSONS].insert_one(lesson)
+        await self._set_progress(user_id, next_module, next_topic, lesson["_id"])
+        return lesson
+
+    async def prefetch_lesson(self, lesson: dict):
+        """Generate a pending lesson and warm the content cache for the
+        topics after it, up to `LESSON_PREFETCH_DEPTH` topics in total.
+        Meant to run as a background task.
+        """
+        user_id: int = lesson["user_id"]
+        if await self._is_quota_exceeded():
+            logging.info(
+                f"learn-prefetch: skipped lesson {lesson['_id']}, organization"
+                f" {self.organization_id} is past its quota"
+            )
+            return
+        try:
+            module: ModuleModel = await self._get_module(str(lesson["module_id"]))
+            topic: TopicModel = self._get_topic(module, lesson["topic_id"])
+            upcoming: list[tuple[ModuleModel, TopicModel]] = [(module, topic)]
+            for _ in range(settings.LESSON_PREFETCH_DEPTH - 1):
+                try:
+                    module, topic = await self._next_module_topic(
+                        module_id=str(module.id), topic_id=topic.id
+                    )
+                except HTTPException:
+                    break
+                upcoming.append((module, topic))
+
+            # topics of a module are generated together, starting with the
+            # lesson's own module so the lesson is ready first.
+            batches: list[tuple[ModuleModel, list[TopicModel]]] = []
+            for module, topic in upcoming:
+                if batches and batches[-1][0].id == module.id:
+                    batches[-1][1].append(topic)
+                else:
+                    batches.append((module, [topic]))
+            lesson_module, lesson_topics = batches[0]
+            if len(lesson_topics) > 1:
+                await self.warm_lessons(
+                    lesson_module, lesson_topics, priority=Priority.PREFETCH
+                )
+
+            await self.single_flight.run(
+                key=self._lesson_key(user_id),
+                call=lambda: self._fill_prefetched_lesson(
+                    lesson, priority=Priority.PREFETCH
+                ),
+                read_result=lambda: self._find_ready_lesson(user_id),
+                priority=Priority.PREFETCH,
+            )
+
+            for batch_module, batch_topics in batches[1:]:
+                await self.warm_lessons(
+                    batch_module, batch_topics, priority=Priority.PREFETCH
+                )
+        except HTTPException as e:
+            # generation failed, a pending lesson is generated again when the
+            # student asks for it.
+            logging.info(f"learn-prefetch: stopped for lesson {lesson['_id']}: {e}")
+
+    async def warm_lesson(
+        self, module: ModuleModel, topic: TopicModel
+    ) -> list[SectionModel]:
+        """Generate a topic's lesson content into the content cache.
+        Raises when it could not be generated, nothing is cached then.
+        """
+        return await self._get_lesson_sections(
+            topic=topic, module=module, priority=Priority.BULK, fallback=False
+        )
+
+    async def warm_lessons(
+        self,
+        module: ModuleModel,
+        topics: list[TopicModel],
+        priority: Priority = Priority.BULK,
+        batch_size: int | None = None,
+    ):
+        """Generate the content of several topics of a module into the
+        content cache, `batch_size` topics per completion.
+
+        Topics missing from a batched completion are generated on their own.
+        A batch only holds topics of the same prompt version. Raises when a
+        topic could not be generated, so it is not taken as warmed.
+        """
+        batch_size = batch_size or settings.LESSON_BATCH_SIZE
+        missing_topics: dict[str, list[TopicModel]] = {}
+        for topic in topics:
+            if await self.content_cache.get(module=module, topic=topic) is None:
+                version: str = get_prompt_version(module.module_number, topic.id)
+                missing_topics.setdefault(version, []).append(topic)
+
+        batches: list[tuple[str, list[TopicModel]]] = [
+            (version, version_topics[start : start + batch_size])
+            for version, version_topics in missing_topics.items()
+            for start in range(0, len(version_topics), batch_size)
+        ]
+        for version, batch in batches:
+            generated: dict[int, list[SectionModel]] = {}
+            usage = LLMUsage()
+            if len(batch) > 1:
+                generated = await self._create_lessons_gpt(
+                    topics=batch, module=module, priority=priority, usage=usage
+                )
+                await self._record_organization_usage(usage)
+                for topic in batch:
+                    record_prompt_parse(version, parsed=topic.id in generated)
+
+            for topic in batch:
+                if topic.id in generated:
+                    await self.content_cache.set(
+                        module=module,
+                        topic=topic,
+                        sections=generated[topic.id],
+                        generation=self._batch_share(
+                            usage, len(generated), prompt_version=version
+                        ),
+                    )
+                else:
+                    await self._get_lesson_sections(
+                        topic=topic, module=module, priority=priority, fallback=False
+                    )
+
+    @staticmethod
+    def _batch_share(
+        usage: LLMUsage, topic_count: int, prompt_version: str
+    ) -> GenerationModel:
+        """Split the usage of a batched completion evenly over its topics."""
+        return GenerationModel(
+            source=GenerationSource.LLM,
+            prompt_version=prompt_version,
+            model=usage.model,
+            llm_calls=usage.llm_calls,
+            prompt_tokens=usage.prompt_tokens // topic_count,
+            completion_tokens=usage.completion_tokens // topic_count,
+            cost_usd=usage.cost_usd / topic_count,
+            llm_seconds=usage.llm_seconds / topic_count,
+            latency_seconds=usage.llm_seconds / topic_count,
+        )
+
+    async def get_generation_report(self, sort_by: str, limit: int) -> list[dict]:
+        """Aggregate the recorded generation of lessons per module topic, to
+        find slow or expensive topics and how often the cache served them.
+
+        Args:
+            sort_by (str): `cost_usd`, `latency_seconds` or `lessons`.
+        """
+        return (
+            await self.db[LESSONS]
+            .aggregate(
+                [
+                    {"$match": {"generation": {"$ne": None}}},
+                    {
+                        "$group": {
+                            "_id": {
+                                "module_id": "$module_id",
+                                "topic_id": "$topic_id",
+                            },
+                            "lessons": {"$sum": 1},
+                            "cache_hits": {
+                                "$sum": {
+                                    "$cond": [
+                                        {
+                                            "$eq": [
+                                                "$generation.source",
+                                                GenerationSource.CACHE.value,
+                                            ]
+                                        },
+                                        1,
+                                        0,
+                                    ]
+                                }
+                            },
+                            "llm_calls": {"$sum": "$generation.llm_calls"},
+                            "prompt_tokens": {"$sum": "$generation.prompt_tokens"},
+                            "completion_tokens": {
+                                "$sum": "$generation.completion_tokens"
+                            },
+                            "cost_usd": {"$sum": "$generation.cost_usd"},
+                            "latency_seconds": {"$avg": "$generation.latency_seconds"},
+                            "max_latency_seconds": {
+                                "$max": "$generation.latency_seconds"
+                            },
+                        }
+                    },
+                    {"$sort": {sort_by: -1}},
+                    {"$limit": limit},
+                ]
+            )
+            .to_list(None)
+        )
+
+    async def get_organization_usage(
+        self, period: UsagePeriod, start: str | None = None
+    ) -> list[dict]:
+        """LLM usage of every organization in a day or month, the current
+        one by default.
+        """
+        start = start or get_period_start(period, datetime_now())
+        return await self.organization_usage.get_report(period, start)
+
+    async def invalidate_module_lessons(self, module_number: int) -> int:
+        """Drop cached lesson content so the module's topics are regenerated."""
+        return await self.content_cache.invalidate_module(module_number)
+
+    async def _insert_lesson(
+        self,
+        user_id: int,
+        module: ModuleModel,
+        topic: TopicModel,
+        on_section: SectionCallback | None = None,
+    ) -> dict:
+        generation = GenerationModel()
+        sections: list[SectionModel] = await self._get_lesson_sections(
+            topic=topic,
+            module=module,
+            on_section=on_section,
+            generation=generation,
         )
+        lesson_model = LessonModel(
+            user_id=user_id,
+            sections=sections,
+            topic_id=topic.id,
+            module_id=module.id,
+            generation=generation,
+        )
+
+        lesson = jsonable_encoder(lesson_model)
+        await self.db[LESSONS].insert_one(lesson)
+        await self._set_progress(user_id, module, topic, lesson["_id"])
+        return lesson
+
+    async def _is_quota_exceeded(self) -> bool:
+        if self.organization_id is None:
+            return False
+        return await self.organization_usage.is_exceeded(self.organization_id)
 
-        current_module = ModuleModel(**current_module)
+    async def _record_organization_usage(self, usage: LLMUsage):
+        if self.organization_id is not None:
+            await self.organization_usage.record(self.organization_id, usage)
 
-        next_topic_id: int = last_lesson.topic_id + 1
+    @staticmethod
+    def _now() -> str:
+        return jsonable_encoder(datetime_now())
+
+    async def _get_progress(self, user_id: int) -> dict | None:
+        """Get the student's progress, None if they never had a lesson."""
+        progress: dict | None = await self.db[PROGRESS].find_one({"user_id": user_id})
+        if progress:
+            return progress
+        return await self._create_progress_from_history(user_id)
+
+    async def _create_progress_from_history(self, user_id: int) -> dict | None:
+        """Build the progress of a student whose lessons predate `PROGRESS`."""
+        last_lesson: list[dict] = (
+            await self.db[LESSONS]
+            .find(
+                filter={"user_id": user_id},
+                sort=[("created_at", -1)],
+            )
+            .to_list(1)
+        )
+        if not last_lesson:
+            return None
+
+        last_lesson: dict = last_lesson[0]
+        module: ModuleModel = await self._get_module(str(last_lesson["module_id"]))
+        progress = ProgressModel(
+            user_id=user_id,
+            module_id=module.id,
+            module_number=module.module_number,
+            topic_id=last_lesson["topic_id"],
+            lesson_id=None if last_lesson["finished"] else last_lesson["_id"],
+            lessons_created=await self.db[LESSONS].count_documents(
+                {"user_id": user_id}
+            ),
+            lessons_finished=await self.db[LESSONS].count_documents(
+                {"user_id": user_id, "finished": True}
+            ),
+        )
+        return await self.db[PROGRESS].find_one_and_update(
+            {"user_id": user_id},
+            {"$setOnInsert": jsonable_encoder(progress)},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _set_progress(
+        self,
+        user_id: int,
+        module: ModuleModel,
+        topic: TopicModel,
+        lesson_id: str,
+    ):
+        """Move the student's progress to a newly created lesson."""
+        progress = ProgressModel(
+            user_id=user_id,
+            module_id=module.id,
+            module_number=module.module_number,
+            topic_id=topic.id,
+            lesson_id=lesson_id,
+        )
+        # encoded with the model's datetime format, like lessons, history
+        # pages compare these strings.
+        progress_fields: dict = jsonable_encoder(
+            progress, exclude={"lessons_created", "lessons_finished"}
+        )
+        progress_id = progress_fields.pop("_id")
+        created_at: str = progress_fields.pop("created_at")
+        await self.db[PROGRESS].find_one_and_update(
+            {"user_id": user_id},
+            {
+                "$set": progress_fields,
+                "$inc": {"lessons_created": 1},
+                "$setOnInsert": {
+                    "_id": progress_id,
+                    "created_at": created_at,
+                },
+            },
+            upsert=True,
+        )
+
+    @staticmethod
+    def _lesson_key(user_id: int) -> str:
+        return f"lesson:{user_id}"
+
+    async def _find_ongoing_lesson(self, user_id: int) -> dict | None:
+        progress: dict | None = await self._get_progress(user_id)
+        if not progress or not progress.get("lesson_id"):
+            return None
+        return await self.db[LESSONS].find_one({"_id": progress["lesson_id"]})
+
+    async def _find_ready_lesson(self, user_id: int) -> dict | None:
+        """Get the ongoing lesson once another worker has generated it."""
+        ongoing_lesson: dict | None = await self._find_ongoing_lesson(user_id)
+        if ongoing_lesson and ongoing_lesson.get("status") != LessonStatus.PENDING:
+            return ongoing_lesson
+        return None
+
+    async def _fill_prefetched_lesson(
+        self, lesson: dict, priority: Priority = Priority.INTERACTIVE
+    ) -> dict:
+        module: ModuleModel = await self._get_module(str(lesson["module_id"]))
+        topic: TopicModel = self._get_topic(module, lesson["topic_id"])
+        return await self._fill_lesson(lesson, module, topic, priority=priority)
+
+    async def _record_prefetch_open(self, lesson: dict):
+        """Count a prefetched lesson as a hit when it was ready the first time
+        the student asked for it, as a miss when it was still pending.
+        """
+        if not lesson.get("prefetched") or lesson.get("opened"):
+            return
+        result = await self.db[LESSONS].update_one(
+            {"_id": lesson["_id"], "opened": {"$ne": True}},
+            {"$set": {"opened": True}},
+        )
+        if not result.modified_count:
+            # another request counted it.
+            return
+        lesson["opened"] = True
+        if lesson.get("status") == LessonStatus.PENDING:
+            prefetch_misses.inc()
+        else:
+            prefetch_hits.inc()
+
+    async def _fill_pending_lesson(
+        self, lesson: dict, on_section: SectionCallback | None = None
+    ) -> dict:
+        module: ModuleModel = await self._get_module(str(lesson["module_id"]))
+        topic: TopicModel = self._get_topic(module, lesson["topic_id"])
+        return await self._fill_lesson(lesson, module, topic, on_section=on_section)
+
+    async def _fill_lesson(
+        self,
+        lesson: dict,
+        module: ModuleModel,
+        topic: TopicModel,
+        on_section: SectionCallback | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> dict:
+        """Generate the sections of a pending lesson, return the ready lesson.
+
+        A lesson filled meanwhile, e.g. by a prefetch that read it while it
+        was pending, is returned as is and its usage is not recorded again.
+        """
+        pending: dict | None = await self.db[LESSONS].find_one(
+            {"_id": lesson["_id"], "status": LessonStatus.PENDING.value}
+        )
+        if not pending:
+            return await self.db[LESSONS].find_one({"_id": lesson["_id"]})
+
+        generation = GenerationModel()
+        sections: list[SectionModel] = await self._get_lesson_sections(
+            topic=topic,
+            module=module,
+            on_section=on_section,
+            priority=priority,
+            generation=generation,
+        )
+        await self.db[LESSONS].update_one(
+            {"_id": lesson["_id"], "status": LessonStatus.PENDING.value},
+            {
+                "$set": {
+                    "sections": jsonable_encoder(sections),
+                    "status": LessonStatus.READY.value,
+                    "generation": jsonable_encoder(generation),
+                }
+            },
+        )
+        return await self.db[LESSONS].find_one({"_id": lesson["_id"]})
+
+    async def _first_module_topic(self) -> tuple[ModuleModel, TopicModel]:
+        first_module: ModuleModel | None = await self._find_module(
+            lambda: module_catalog.get_by_number(1)
+        )
+        if not first_module:
+            raise ModuleNotFoundException(1)
+
+        # create a first topic if one does not exist.
+        first_topic: TopicModel | None = None
+        if len(first_module.topics) == 0:
+            first_topic = TopicModel(id=1, title=first_module.module_name)
+        else:
+            first_topic: dict | TopicModel = first_module.topics[0]
+            first_topic: TopicModel = (
+                TopicModel(**first_topic)
+                if isinstance(first_topic, dict)
+                else TopicModel(**first_topic.dict())
+            )
+        return first_module, first_topic
+
+    async def _next_module_topic(
+        self, module_id: str, topic_id: int
+    ) -> tuple[ModuleModel, TopicModel]:
+        """Walk to the topic after `topic_id`, moving to the next module once
+        the current one has no topics left.
+        """
+        current_module: ModuleModel = await self._get_module(module_id)
+
+        next_topic_id: int = topic_id + 1
         next_module: ModuleModel = current_module
         if next_topic_id > len(current_module.topics):
-            print(
-                f"INFO: module {current_module.module_number} topics finished, moving to next module"
+            logging.debug(
+                f"learn-lesson: module {current_module.module_number} topics"
+                " finished, moving to the next module"
             )
             # no more topics are left in the current module
             # move to the next module.
             next_module_number = current_module.module_number + 1
-            next_module = await self.db[MODULES].find_one(
-                {"module_number": next_module_number}
+            next_module = await self._find_module(
+                lambda: module_catalog.get_by_number(next_module_number)
             )
             # reset topic id to the first topic of the next module
             next_topic_id = 1
@@ -128,84 +875,306 @@ class LearnService:
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"All modules finished. Last Module: {next_module_number - 1}",
                 )
-            next_module = ModuleModel(**next_module)
 
-        """safest way to avoid index erros is to scan the list and match
-        the expected topic id.
+        next_topic: TopicModel = self._get_topic(next_module, next_topic_id)
+        logging.debug(
+            f"learn-lesson: next module {next_module.module_number}"
+            f" topic {next_topic.id} {next_topic.title}"
+        )
+        return next_module, next_topic
+
+    async def _get_module(self, module_id: str) -> ModuleModel:
+        module: ModuleModel | None = await self._find_module(
+            lambda: module_catalog.get_by_id(module_id)
+        )
+        if not module:
+            raise ModuleNotFoundException(module_id)
+        return module
+
+    async def _find_module(
+        self, lookup: Callable[[], ModuleModel | None]
+    ) -> ModuleModel | None:
+        """Look a module up in the catalog, reloading it once on a miss in
+        case the module was just created through another worker.
         """
-        next_topic: TopicModel | None = None
-        for topic in next_module.topics:
-            if topic.id == next_topic_id:
-                next_topic = topic
-        print("Next Topic", next_topic.title)
-        print("Next Module", next_module.module_number)
+        await module_catalog.refresh(self.db)
+        module: ModuleModel | None = lookup()
+        if module:
+            return module
+
+        await module_catalog.refresh(self.db, force=True)
+        return lookup()
+
+    @staticmethod
+    def _get_topic(module: ModuleModel, topic_id: int) -> TopicModel:
+        """Match the expected topic id, topic ids need not follow list order."""
+        topic: TopicModel | None = module_catalog.get_topic(module, topic_id)
         # handle case: no topic.
-        if not next_topic:
-            next_topic = TopicModel(id=1, title=next_module.module_name)
+        if not topic:
+            topic = TopicModel(id=1, title=module.module_name)
+        return topic
 
-        print("calling Gippity....")
-        gpt_content: list[SectionModel] = self._create_lesson_gpt(
-            topic=next_topic,
-            module=next_module,
-        )
-        print("Gippity done")
-        lesson_model = LessonModel(
-            user_id=user_id,
-            sections=gpt_content,
-            topic_id=next_topic.id,
-            module_id=next_module.id,
-        )
+    async def _get_lesson_sections(
+        self,
+        topic: TopicModel,
+        module: ModuleModel,
+        on_section: SectionCallback | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+        generation: GenerationModel | None = None,
+        fallback: bool = True,
+    ) -> list[SectionModel]:
+        """Get the sections of a topic from the content cache or GPT.
 
-        lesson = jsonable_encoder(lesson_model)
-        new_lesson = await self.db[LESSONS].insert_one(lesson)
-        created_lesson: LessonModel = await self.db[LESSONS].find_one(
-            {"_id": new_lesson.inserted_id}
+        When `on_section` is given the completion is streamed and each
+        section is passed to it as soon as it is parsed. Students reaching
+        an uncached topic at the same time share a single completion. When
+        the LLM fails, the closest previously generated lesson is served,
+        unless `fallback` is False and the error is raised.
+
+        How the sections were produced is recorded into `generation`.
+        """
+        started_at: float = time.monotonic()
+        generation = generation or GenerationModel()
+        generation.source = GenerationSource.SHARED
+        generation.prompt_version = get_prompt_version(module.module_number, topic.id)
+        emitted_section_ids: set[int] = set()
+
+        def emit(section: SectionModel):
+            emitted_section_ids.add(section.id)
+            on_section(section)
+
+        sections: list[SectionModel] | None = await self.content_cache.get(
+            module=module, topic=topic
         )
-        return created_lesson
+        if sections is not None:
+            generation.source = GenerationSource.CACHE
+        else:
 
-    async def create_new_module(self, req: ModuleModel) -> ModuleModel:
-        module = jsonable_encoder(req)
-        new_module = await self.db[MODULES].insert_one(module)
-        created_module: ModuleModel = await self.db[MODULES].find_one(
-            {"_id": new_module.inserted_id}
+            async def generate() -> list[SectionModel]:
+                # another worker may have finished the topic meanwhile.
+                cached: list[SectionModel] | None = await self.content_cache.get(
+                    module=module, topic=topic
+                )
+                if cached is not None:
+                    return cached
+
+                generation.source = GenerationSource.LLM
+                if on_section:
+                    generated: list[SectionModel] = await self._stream_lesson_gpt(
+                        topic=topic,
+                        module=module,
+                        on_section=emit,
+                        priority=priority,
+                        usage=generation,
+                    )
+                else:
+                    generated = await self._create_lesson_gpt(
+                        topic=topic,
+                        module=module,
+                        priority=priority,
+                        usage=generation,
+                    )
+                generation.latency_seconds = time.monotonic() - started_at
+                await self.content_cache.set(
+                    module=module,
+                    topic=topic,
+                    sections=generated,
+                    generation=generation,
+                )
+                return generated
+
+            try:
+                if await self._is_quota_exceeded():
+                    raise OrganizationQuotaExceededException(self.organization_id)
+                sections = await self.single_flight.run(
+                    key=f"content:{self.content_cache.make_key(module, topic)}",
+                    call=generate,
+                    read_result=lambda: self.content_cache.get(
+                        module=module, topic=topic
+                    ),
+                    priority=priority,
+                )
+            except (
+                LLMTimeoutException,
+                LLMServiceException,
+                LLMUnavailableException,
+                OrganizationQuotaExceededException,
+            ) as e:
+                if not fallback:
+                    raise
+                sections = await self._find_fallback_sections(module, topic)
+                if sections is None:
+                    lesson_fallback_misses.inc()
+                    raise
+                generation.source = GenerationSource.FALLBACK
+                lesson_fallbacks.inc()
+                if isinstance(e, OrganizationQuotaExceededException):
+                    quota_fallbacks.inc()
+                logging.warning(
+                    f"learn-fallback: module {module.module_number} topic {topic.id}"
+                    f" served from an earlier lesson: {e.detail}"
+                )
+
+        generation.latency_seconds = time.monotonic() - started_at
+        lesson_sources[generation.source].inc()
+        lesson_latency.observe(generation.latency_seconds)
+        if generation.source == GenerationSource.LLM:
+            await self._record_organization_usage(generation)
+            logging.info(
+                f"learn-generation: module {module.module_number} topic {topic.id}"
+                f" {generation.prompt_tokens}+{generation.completion_tokens} tokens"
+                f" in {generation.latency_seconds:.1f}s"
+                f" over {generation.llm_calls} calls"
+            )
+
+        if on_section:
+            for section in sections:
+                if section.id not in emitted_section_ids:
+                    on_section(section)
+        return sections
+
+    async def _find_fallback_sections(
+        self, module: ModuleModel, topic: TopicModel
+    ) -> list[SectionModel] | None:
+        """Find the topic's content generated by an older prompt, or else
+        the latest lesson a student got for it.
+        """
+        sections: list[SectionModel] | None = await self.content_cache.get_closest(
+            module=module, topic=topic
         )
-        return created_module
+        if sections:
+            return sections
 
-    async def finish_lesson(self, user_id: int) -> str | None:
-        """Get the last ongoing lesson, if any or create a new one."""
-        ongoing_lessons: list[LessonModel] = (
+        lessons: list[dict] = (
             await self.db[LESSONS]
             .find(
                 filter={
-                    "finished": False,
-                    "user_id": user_id,
+                    "module_id": str(module.id),
+                    "topic_id": topic.id,
+                    "sections.0": {"$exists": True},
                 },
                 sort=[("created_at", -1)],
             )
-            .to_list(self.max_lessons)
+            .to_list(1)
         )
-
-        if not ongoing_lessons or len(ongoing_lessons) == 0:
+        if not lessons:
             return None
+        return [
+            construct_trusted(SectionModel, section)
+            for section in lessons[0]["sections"]
+        ]
 
-        await self.db[LESSONS].update_one(
-            {"_id": ongoing_lessons[0]["_id"]},
-            {"$set": {"finished": True}},
+    async def _create_lesson_gpt(
+        self,
+        topic: TopicModel,
+        module: ModuleModel,
+        priority: Priority = Priority.INTERACTIVE,
+        usage: LLMUsage | None = None,
+    ) -> list[SectionModel]:
+        """Create a lesson using GPT-3 and parse its output."""
+        new_lesson_content = await OpenAIService(usage=usage).create_new_lesson(
+            topic=topic,
+            module=module,
+            priority=priority,
         )
-        return ongoing_lessons[0]["_id"]
+        parser = SectionStreamParser()
+        parser.feed(new_lesson_content)
+        parser.finish()
+        return await self._complete_sections(
+            topic, module, parser, priority, usage=usage
+        )
+
+    async def _create_lessons_gpt(
+        self,
+        topics: list[TopicModel],
+        module: ModuleModel,
+        priority: Priority = Priority.BULK,
+        usage: LLMUsage | None = None,
+    ) -> dict[int, list[SectionModel]]:
+        """Create the lessons of several topics with one GPT completion."""
+        content: str = await OpenAIService(usage=usage).create_new_lessons(
+            topics=topics,
+            module=module,
+            priority=priority,
+        )
+        return parse_lesson_batch(content)
 
-    def _create_lesson_gpt(
-        self, topic: TopicModel, module: ModuleModel
+    async def _stream_lesson_gpt(
+        self,
+        topic: TopicModel,
+        module: ModuleModel,
+        on_section: SectionCallback,
+        priority: Priority = Priority.INTERACTIVE,
+        usage: LLMUsage | None = None,
     ) -> list[SectionModel]:
-        """Create a lesson using GPT-3 and parse its output."""
-        new_lesson_content = OpenAIService().create_new_lesson(
+        """Stream a lesson from GPT-3, parsing sections as they complete."""
+        parser = SectionStreamParser()
+        async for text in OpenAIService(usage=usage).stream_new_lesson(
             topic=topic,
             module=module,
+            priority=priority,
+        ):
+            for section in parser.feed(text):
+                on_section(section)
+
+        for section in parser.finish():
+            on_section(section)
+        return await self._complete_sections(
+            topic, module, parser, priority, on_section=on_section, usage=usage
         )
-        content: dict = json.loads(new_lesson_content)
 
-        sections: list[SectionModel] = []
-        for section in content["sections"]:
-            sections.append(SectionModel(**section))
+    async def _complete_sections(
+        self,
+        topic: TopicModel,
+        module: ModuleModel,
+        parser: SectionStreamParser,
+        priority: Priority,
+        on_section: SectionCallback | None = None,
+        usage: LLMUsage | None = None,
+    ) -> list[SectionModel]:
+        """Ask once for the sections a cut off lesson is missing, instead of
+        generating the whole lesson again.
+        """
+        record_prompt_parse(
+            get_prompt_version(module.module_number, topic.id),
+            parsed=not parser.incomplete,
+        )
+        sections: list[SectionModel] = parser.sections[:MAX_SECTIONS]
+        if not sections and not parser.repaired:
+            raise LLMServiceException("the lesson output could not be parsed.")
+        if not parser.incomplete or len(sections) == MAX_SECTIONS:
+            return sections
+        if not sections:
+            # the first section was cut off, continue after its repaired part.
+            sections = [parser.repaired]
+            if on_section:
+                on_section(parser.repaired)
+
+        lesson_reasks.inc()
+        try:
+            content: str = await OpenAIService(usage=usage).continue_lesson(
+                topic=topic,
+                module=module,
+                sections=sections,
+                priority=priority,
+            )
+            missing_sections: list[SectionModel] = parse_lesson_sections(content)
+        except (
+            LLMTimeoutException,
+            LLMServiceException,
+            LLMUnavailableException,
+            LessonParseError,
+        ) as e:
+            logging.warning(
+                f"learn-parser: module {module.module_number} topic {topic.id} "
+                f"kept {len(sections)} sections, asking for the rest failed: {e}"
+            )
+            # fall back to the repaired part of the cut off section.
+            missing_sections = [
+                section for section in [parser.repaired] if section not in sections
+            ]
 
+        for section in append_missing_sections(sections, missing_sections):
+            if on_section:
+                on_section(section)
         return sections
@@ -0,0 +1,148 @@
+import asyncio
+import uuid
+from datetime import timedelta
+from typing import Awaitable, Callable, TypeVar
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+from src.config import settings
+from src.db.model import datetime_now
+from src.learn.utils import LESSON_LEASES
+from src.openai.scheduler import Priority, PriorityTicket, priority_ticket
+
+T = TypeVar("T")
+
+# calls running in this worker, awaited by callers with the same key.
+_in_flight: dict[str, asyncio.Future] = {}
+# priority of the LLM calls of each running call, raised by callers joining it.
+_tickets: dict[str, PriorityTicket] = {}
+
+
+class OwnerCancelled(Exception):
+    """The caller running a call was cancelled before it finished."""
+
+
+class SingleFlight:
+    """
+    Run at most one call per key across every worker.
+
+    Callers in the same worker await the running call's future. Across
+    workers a lease document in `LESSON_LEASES` marks the owner, other
+    workers poll `read_result` until the owner is done or its lease expires.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase) -> None:
+        # reference to the learn database.
+        self.db = db
+        self.lease_seconds: int = settings.LESSON_LEASE_SECONDS
+        self.poll_interval: float = 0.5
+
+    async def run(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[T]],
+        read_result: Callable[[], Awaitable[T | None]],
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> T:
+        """Run `call` unless another caller is already running it for `key`.
+
+        Args:
+            key (str): identifies the work, e.g. `lesson:<user_id>`.
+            call: does the work, it must re-check whether the work is needed.
+            read_result: reads the result written by another worker, None
+            while it is not available yet.
+            priority: lane of the caller. A caller joining a call in this
+            worker raises the call's LLM requests to its lane, so a student
+            does not wait behind the queue of a prefetch.
+
+        When the caller running `call` is cancelled, e.g. a client left, the
+        callers that joined it are not: one of them runs `call` again.
+        """
+        while key in _in_flight:
+            _tickets[key].promote(priority)
+            try:
+                return await asyncio.shield(_in_flight[key])
+            except OwnerCancelled:
+                continue
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        _in_flight[key] = future
+        try:
+            with priority_ticket(priority) as ticket:
+                _tickets[key] = ticket
+                result: T = await self._run_with_lease(key, call, read_result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # joined callers retry instead of being cancelled too.
+            future.set_exception(OwnerCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # mark the exception as retrieved when nobody else was waiting.
+            future.exception()
+            raise
+        finally:
+            _in_flight.pop(key, None)
+            _tickets.pop(key, None)
+
+    async def run_if_idle(
+        self, key: str, call: Callable[[], Awaitable[T]]
+    ) -> T | None:
+        """Run `call` under the lease of `key`, unless a call for `key` is
+        already running in any worker, then return None without waiting.
+
+        Callers of `run` arriving meanwhile wait for the lease to be released,
+        they do not share `call`'s result.
+        """
+        if key in _in_flight:
+            return None
+
+        owner: str = uuid.uuid4().hex
+        if not await self._acquire_lease(key, owner):
+            return None
+        try:
+            return await call()
+        finally:
+            await self.db[LESSON_LEASES].delete_one({"_id": key, "owner": owner})
+
+    async def _run_with_lease(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[T]],
+        read_result: Callable[[], Awaitable[T | None]],
+    ) -> T:
+        owner: str = uuid.uuid4().hex
+        while True:
+            if await self._acquire_lease(key, owner):
+                try:
+                    return await call()
+                finally:
+                    await self.db[LESSON_LEASES].delete_one(
+                        {"_id": key, "owner": owner}
+                    )
+
+            await asyncio.sleep(self.poll_interval)
+            result: T | None = await read_result()
+            if result is not None:
+                return result
+
+    async def _acquire_lease(self, key: str, owner: str) -> bool:
+        now = datetime_now()
+        try:
+            await self.db[LESSON_LEASES].find_one_and_update(
+                {"_id": key, "expires_at": {"$lt": now}},
+                {
+                    "$set": {
+                        "owner": owner,
+                        "expires_at": now + timedelta(seconds=self.lease_seconds),
+                    }
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # lease is held by another worker and has not expired.
+            return False
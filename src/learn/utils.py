@@ -1,6 +1,20 @@
+import json
+
+from fastapi.encoders import jsonable_encoder
+
 # database
 EVOLVE_LEARNING = "evolve-learning"
 
 # collections
 LESSONS = "lessons"
 MODULES = "modules"
+LESSON_CONTENT = "lesson_content"
+LESSON_LEASES = "lesson_leases"
+PROGRESS = "progress"
+META = "meta"
+LLM_USAGE = "llm_usage"
+
+
+def sse_event(event: str, data) -> str:
+    """Format `data` as a server sent event."""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
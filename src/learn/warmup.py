@@ -0,0 +1,137 @@
+"""
+Pre-generate lesson content for every topic of every module.
+
+    python -m src.learn.warmup --concurrency 4 --rpm 60 --tpm 90000 --batch-size 3
+
+Generated topics are recorded in a checkpoint file, an interrupted run
+continues where it stopped when started again with the same checkpoint.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+from src.config import settings
+from src.db.mongodb import db
+from src.db.mongodb_utils import close_mongo_connection, connect_to_mongo
+from src.learn.serializers import ModuleModel, TopicModel
+from src.learn.service import LearnService
+from src.openai.scheduler import LLMScheduler, Priority, set_llm_scheduler
+
+
+class Checkpoint:
+    """Set of warmed topic keys persisted to a JSON file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.done: set[str] = set()
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                self.done = set(json.load(checkpoint_file)["done"])
+
+    def add(self, key: str):
+        self.done.add(key)
+        # write to a temporary file first, a crash never corrupts the checkpoint.
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as checkpoint_file:
+            json.dump({"done": sorted(self.done)}, checkpoint_file)
+        os.replace(temp_path, self.path)
+
+
+async def warm_topics(
+    learn_service: LearnService,
+    module: ModuleModel,
+    topics: list[TopicModel],
+    checkpoint: Checkpoint,
+    concurrency: asyncio.Semaphore,
+):
+    """Generate a batch of topics of a module with one completion."""
+    topic_ids: str = ", ".join(str(topic.id) for topic in topics)
+    async with concurrency:
+        try:
+            await learn_service.warm_lessons(
+                module=module, topics=topics, batch_size=len(topics)
+            )
+        except Exception as e:
+            logging.error(
+                f"warmup: module {module.module_number} topics {topic_ids} failed: {e}"
+            )
+            return
+
+        for topic in topics:
+            checkpoint.add(learn_service.content_cache.make_key(module, topic))
+        logging.info(f"warmup: module {module.module_number} topics {topic_ids} done")
+
+
+async def warmup(args: argparse.Namespace):
+    await connect_to_mongo()
+    try:
+        learn_service = LearnService(db=db.client)
+        checkpoint = Checkpoint(args.checkpoint)
+        # warm-up runs on its own, with the budget given on the command line.
+        # No student shares it, so no lane keeps a reserve.
+        set_llm_scheduler(
+            LLMScheduler(
+                args.rpm,
+                args.tpm,
+                reserved_share={priority: 0 for priority in Priority},
+            )
+        )
+        concurrency = asyncio.Semaphore(args.concurrency)
+
+        tasks = []
+        for module in await learn_service.get_modules():
+            if args.module and module.module_number not in args.module:
+                continue
+
+            topics: list[TopicModel] = module.topics or [
+                TopicModel(id=1, title=module.module_name)
+            ]
+            topics = [
+                topic
+                for topic in topics
+                if learn_service.content_cache.make_key(module, topic)
+                not in checkpoint.done
+            ]
+            for start in range(0, len(topics), args.batch_size):
+                tasks.append(
+                    warm_topics(
+                        learn_service,
+                        module,
+                        topics[start : start + args.batch_size],
+                        checkpoint,
+                        concurrency,
+                    )
+                )
+
+        logging.info(f"warmup: generating {len(tasks)} batches of topics")
+        await asyncio.gather(*tasks)
+    finally:
+        await close_mongo_connection()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-generate lesson content.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=60, help="requests per minute")
+    parser.add_argument("--tpm", type=int, default=90000, help="tokens per minute")
+    parser.add_argument("--checkpoint", default=".warmup_checkpoint.json")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.LESSON_BATCH_SIZE,
+        help="topics of a module generated by one completion.",
+    )
+    parser.add_argument(
+        "--module",
+        type=int,
+        action="append",
+        help="module number to warm, can be repeated. Defaults to all modules.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(warmup(parse_args()))
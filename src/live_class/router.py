@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from prisma.models import Student
 
 from src.auth.utils import get_current_admin
@@ -23,10 +23,12 @@ async def create_new_live_class(create_req: CreateLiveClass, _: dict = Depends(g
 @router.get("/")
 async def get_live_class(
         batch_id: int,
+        response: Response,
         _from: datetime = None,
         _to: datetime = None,
         skip: int = 0,
         limit: int = 10,
+        cursor: str | None = None,
         student_data: dict = Depends(get_current_student)
 ):
     student_id: int = student_data["id"]
@@ -35,7 +37,12 @@ async def get_live_class(
     if student.batch_id != batch_id:
         raise BATCH_NOT_ALLOWED
 
-    return await LiveClassService().get_by_batch(batch_id, _from, _to, skip, limit)
+    live_classes, next_cursor = await LiveClassService().get_by_batch(
+        batch_id, _from, _to, skip, limit, cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return live_classes
 
 
 @router.patch("/{live_class_id}")
@@ -27,8 +27,9 @@ class LiveClassService:
             _from: datetime = None,
             _to: datetime = None,
             skip: int = 0,
-            limit: int = 10
-    ):
+            limit: int = 10,
+            cursor: str | None = None,
+    ) -> tuple[list[LiveClass], str | None]:
         where = {
             "batch_id": batch_id
         }
@@ -42,13 +43,14 @@ class LiveClassService:
             _to = _to if _to else get_current_time()
             where["class_starts_at"] = {"gte": _from, "lte": _to}
 
-        return await self.model.find_many(where=where, include=include, skip=skip, limit=limit)
+        return await self.model.find_page(
+            where=where, include=include, cursor=cursor, skip=skip, limit=limit
+        )
 
     async def update_live_class(
             self, live_class_id: int, edit_live_class_req: EditLiveClass
     ):
-        live_class: LiveClass = await self.get(live_class_id)
-        updated_live_class: LiveClass = await self.model.update(
-            live_class_id, live_class, edit_live_class_req
+        updated_live_class: LiveClass = await self.model.update_partial(
+            live_class_id, edit_live_class_req
         )
         return updated_live_class
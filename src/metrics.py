@@ -0,0 +1,87 @@
+from typing import Callable
+
+
+class Counter:
+    """Monotonic counter, reset only when the worker restarts."""
+
+    def __init__(self, name: str, description: str = "") -> None:
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def inc(self, amount: int | float = 1):
+        self.value += amount
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, like prometheus."""
+
+    # seconds, suits latencies from a cache read to an LLM completion.
+    DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(
+        self, name: str, description: str = "", buckets=DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        self.bucket_counts: list[int] = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: int | float):
+        self.count += 1
+        self.sum += value
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[index] += 1
+
+    @property
+    def value(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {
+                str(upper_bound): count
+                for upper_bound, count in zip(self.buckets, self.bucket_counts)
+            },
+        }
+
+
+class MetricsRegistry:
+    """
+    Process local registry of metrics.
+    Each worker reports its own values, aggregate them when scraping.
+    """
+
+    def __init__(self) -> None:
+        self.counters: dict[str, Counter] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self.gauges: dict[str, Callable[[], int | float]] = {}
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        if name not in self.counters:
+            self.counters[name] = Counter(name, description)
+        return self.counters[name]
+
+    def histogram(self, name: str, description: str = "", **kwargs) -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, description, **kwargs)
+        return self.histograms[name]
+
+    def gauge(self, name: str, read_value: Callable[[], int | float]):
+        """Register a value that is computed when the metrics are read."""
+        self.gauges[name] = read_value
+
+    def snapshot(self) -> dict[str, int | float | dict]:
+        values: dict[str, int | float | dict] = {
+            name: counter.value for name, counter in self.counters.items()
+        }
+        for name, histogram in self.histograms.items():
+            values[name] = histogram.value
+        for name, read_value in self.gauges.items():
+            values[name] = read_value()
+        return values
+
+
+metrics = MetricsRegistry()
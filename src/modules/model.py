@@ -2,8 +2,12 @@ from prisma.models import Module
 
 from src.modules.serializers import CreateModule, EditModule
 from src.crud_base import CRUDBaseModel
+from src.entity_cache import EntityCache
+
+# modules only change when the catalog is edited.
+MODULE_CACHE = EntityCache("module", ttl=300)
 
 
 class ModuleModel(CRUDBaseModel[CreateModule, EditModule]):
     def __init__(self):
-        super().__init__(Module)
+        super().__init__(Module, cache=MODULE_CACHE)
@@ -18,6 +18,5 @@ class ModuleService:
         return module
 
     async def update_module(self, module_id: int, module_edit: EditModule):
-        module: Module = await self.get_module(module_id)
-        updated_module = await self.model.update(module_id, module, module_edit)
+        updated_module: Module = await self.model.update_partial(module_id, module_edit)
         return updated_module
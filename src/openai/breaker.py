@@ -0,0 +1,82 @@
+import logging
+import time
+from enum import Enum
+
+from src.config import settings
+from src.metrics import metrics
+from src.openai.exceptions import LLMUnavailableException
+
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+# number of times the breaker entered each state.
+state_changes = {
+    state: metrics.counter(f"llm_breaker_{state.value}_total")
+    for state in BreakerState
+}
+
+
+class CircuitBreaker:
+    """
+    Stop calling the LLM after `failure_threshold` consecutive failures.
+
+    While open, calls fail at once with `LLMUnavailableException`. After
+    `reset_seconds` one probe call is let through (half open), its success
+    closes the breaker and its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened_at: float = 0
+        self.probing = False
+
+    def check(self):
+        """Raise `LLMUnavailableException` unless a call may be made."""
+        if self.state == BreakerState.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                raise LLMUnavailableException()
+            self._set_state(BreakerState.HALF_OPEN)
+
+        if self.state == BreakerState.HALF_OPEN:
+            if self.probing:
+                raise LLMUnavailableException()
+            self.probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self.probing = False
+        if self.state != BreakerState.CLOSED:
+            self._set_state(BreakerState.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == BreakerState.HALF_OPEN or (
+            self.state == BreakerState.CLOSED
+            and self.failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self._set_state(BreakerState.OPEN)
+
+    def release(self):
+        """Give up a call without an outcome, e.g. when it was cancelled."""
+        self.probing = False
+
+    def _set_state(self, state: BreakerState):
+        logging.warning(f"llm-breaker: {self.state.value} -> {state.value}")
+        self.state = state
+        state_changes[state].inc()
+
+
+llm_breaker = CircuitBreaker(
+    failure_threshold=settings.LLM_BREAKER_FAILURES,
+    reset_seconds=settings.LLM_BREAKER_RESET_SECONDS,
+)
+metrics.gauge("llm_breaker_open", lambda: int(llm_breaker.state != BreakerState.CLOSED))
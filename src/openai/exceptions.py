@@ -0,0 +1,37 @@
+from fastapi import HTTPException, status
+
+
+class LLMTimeoutException(HTTPException):
+    def __init__(self, timeout: float):
+        super().__init__(
+            status.HTTP_504_GATEWAY_TIMEOUT,
+            f"LLM did not respond within {timeout} seconds.",
+        )
+
+
+class LLMQueueTimeoutException(LLMTimeoutException):
+    """Timed out in the scheduler's queue, before the request was sent.
+    Says nothing about the provider's health, the breaker ignores it.
+    """
+
+    def __init__(self, timeout: float):
+        HTTPException.__init__(
+            self,
+            status.HTTP_504_GATEWAY_TIMEOUT,
+            f"LLM request was not sent within {timeout} seconds, too many are queued.",
+        )
+
+
+class LLMServiceException(HTTPException):
+    def __init__(self, error=""):
+        super().__init__(
+            status.HTTP_502_BAD_GATEWAY, detail=f"LLM Service Error : {error}"
+        )
+
+
+class LLMUnavailableException(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            "LLM Service is unavailable, try again later.",
+        )
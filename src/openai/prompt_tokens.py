@@ -0,0 +1,107 @@
+"""
+Count the tokens of every lesson prompt version, offline.
+
+    python -m src.openai.prompt_tokens --batch-size 3
+
+Tokens are counted with `tiktoken` when it is installed, otherwise they are
+approximated from the prompt length.
+"""
+import argparse
+
+from src.config import settings
+from src.learn.serializers import ModuleModel, TopicModel
+from src.openai.providers import approximate_tokens
+from src.openai.service import PROMPT_VERSION, PROMPTS
+
+try:
+    import tiktoken
+except ImportError:  # optional, only makes the counts exact.
+    tiktoken = None
+
+# stand-in module, prompt length barely depends on the titles.
+SAMPLE_MODULE = ModuleModel(
+    module_number=1,
+    module_name="Personal Finance Basics",
+    topics=[
+        TopicModel(id=1, title="What is a budget"),
+        TopicModel(id=2, title="Saving for emergencies"),
+        TopicModel(id=3, title="Understanding interest rates"),
+        TopicModel(id=4, title="Good and bad debt"),
+        TopicModel(id=5, title="Starting to invest"),
+    ],
+)
+
+
+def get_token_counter(model: str):
+    if tiktoken is None:
+        return approximate_tokens
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text))
+
+
+def analyze(model: str, batch_size: int) -> list[dict]:
+    """Prompt tokens of a single lesson and of a batch, per prompt version."""
+    count_tokens = get_token_counter(model)
+    module = SAMPLE_MODULE
+    topic = module.topics[0]
+    batch = module.topics[:batch_size]
+
+    rows: list[dict] = []
+    for version, prompts in PROMPTS.items():
+        single_tokens: int = count_tokens(
+            prompts.single(
+                module_number=module.module_number,
+                module_name=module.module_name,
+                topic_number=topic.id,
+                topic_name=topic.title,
+            )
+        )
+        batch_tokens: int = count_tokens(
+            prompts.batch(
+                module_number=module.module_number,
+                module_name=module.module_name,
+                topics=batch,
+            )
+        )
+        rows.append(
+            {
+                "version": version,
+                "single": single_tokens,
+                "batch": batch_tokens,
+                "batch_per_topic": batch_tokens // len(batch),
+            }
+        )
+    return rows
+
+
+def print_report(rows: list[dict], batch_size: int):
+    baseline: dict = next(
+        (row for row in rows if row["version"] == PROMPT_VERSION), rows[0]
+    )
+    batch_header: str = f"batch of {batch_size}"
+    print(f"{'version':<8} {'single':>8} {batch_header:>12} {'per topic':>10}")
+    for row in rows:
+        change: float = row["single"] / baseline["single"] - 1
+        print(
+            f"{row['version']:<8} {row['single']:>8} {row['batch']:>12}"
+            f" {row['batch_per_topic']:>10}"
+            f"  ({change:+.0%} single prompt vs {baseline['version']})"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count lesson prompt tokens.")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.LESSON_BATCH_SIZE,
+        help=f"topics per batched prompt, at most {len(SAMPLE_MODULE.topics)}.",
+    )
+    args = parser.parse_args()
+    if tiktoken is None:
+        print("tiktoken is not installed, token counts are approximate.")
+    print_report(analyze(args.model, args.batch_size), args.batch_size)
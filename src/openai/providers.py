@@ -0,0 +1,302 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+import aiohttp
+import openai
+
+from src.config import settings
+from src.openai.exceptions import LLMServiceException, LLMTimeoutException
+
+openai.api_key = settings.OPENAI_API_KEY
+
+# HTTP session shared by every LLM call made by this worker.
+_session: aiohttp.ClientSession | None = None
+
+
+def get_openai_session() -> aiohttp.ClientSession:
+    """Get the worker wide HTTP session and bind it to the current context.
+
+    `openai.aiosession` is a context variable, so it is set on every call;
+    without it the client opens (and tears down) a new connection per request.
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=settings.OPENAI_MAX_CONNECTIONS),
+        )
+    openai.aiosession.set(_session)
+    return _session
+
+
+async def close_openai_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def approximate_tokens(text: str) -> int:
+    """Rough token count of english text, ~4 characters per token."""
+    return max(1, len(text) // 4)
+
+
+class LLMProvider(ABC):
+    """
+    Backend answering chat completions.
+    Responses use the OpenAI shape: `{"choices": [...], "usage": {...}}`.
+    """
+
+    model: str = "gpt-3.5-turbo"
+
+    @abstractmethod
+    async def complete(self, messages: list[dict], timeout: float) -> dict:
+        """Get a whole completion, raises `LLMTimeoutException` after `timeout`."""
+
+    @abstractmethod
+    def stream(self, messages: list[dict], timeout: float) -> AsyncIterator[str]:
+        """Stream completion text, `timeout` applies to each chunk."""
+
+
+class OpenAIProvider(LLMProvider):
+    async def complete(self, messages: list[dict], timeout: float) -> dict:
+        """Await a chat completion without blocking the event loop.
+
+        The call is cancelled once `timeout` elapses, cancelling the
+        awaiting task cancels the in-flight HTTP request as well.
+        """
+        get_openai_session()
+        try:
+            return await asyncio.wait_for(
+                openai.ChatCompletion.acreate(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0,
+                    request_timeout=timeout,
+                ),
+                timeout=timeout,
+            )
+        except (asyncio.TimeoutError, openai.error.Timeout):
+            raise LLMTimeoutException(timeout)
+        except openai.error.OpenAIError as e:
+            raise LLMServiceException(e)
+
+    async def stream(self, messages: list[dict], timeout: float) -> AsyncIterator[str]:
+        get_openai_session()
+        try:
+            response = await asyncio.wait_for(
+                openai.ChatCompletion.acreate(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0,
+                    request_timeout=timeout,
+                    stream=True,
+                ),
+                timeout=timeout,
+            )
+
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    break
+
+                text: str | None = chunk["choices"][0]["delta"].get("content")
+                if text:
+                    yield text
+        except (asyncio.TimeoutError, openai.error.Timeout):
+            raise LLMTimeoutException(timeout)
+        except openai.error.OpenAIError as e:
+            raise LLMServiceException(e)
+
+
+class RecordReplayProvider(LLMProvider):
+    """
+    Serve completions saved on disk, one JSON file per prompt.
+
+    In `record` mode calls go to `recorded_provider` and are saved, in
+    `replay` mode only saved completions are served, a prompt that was never
+    recorded raises `LLMServiceException`.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        record: bool = False,
+        recorded_provider: LLMProvider | None = None,
+    ) -> None:
+        self.directory = directory
+        self.record = record
+        self.recorded_provider = recorded_provider or OpenAIProvider()
+        os.makedirs(directory, exist_ok=True)
+
+    async def complete(self, messages: list[dict], timeout: float) -> dict:
+        if self.record:
+            response: dict = await self.recorded_provider.complete(messages, timeout)
+            self._save(messages, response)
+            return response
+        return self._load(messages)
+
+    async def stream(self, messages: list[dict], timeout: float) -> AsyncIterator[str]:
+        if self.record:
+            chunks: list[str] = []
+            async for text in self.recorded_provider.stream(messages, timeout):
+                chunks.append(text)
+                yield text
+            self._save(messages, completion_response("".join(chunks), messages))
+            return
+
+        content: str = self._load(messages)["choices"][0]["message"]["content"]
+        for position in range(0, len(content), 16):
+            yield content[position : position + 16]
+
+    def _path(self, messages: list[dict]) -> str:
+        key: str = hashlib.sha256(
+            json.dumps([self.model, messages], sort_keys=True).encode()
+        ).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _save(self, messages: list[dict], response: dict):
+        with open(self._path(messages), "w") as recording:
+            json.dump({"messages": messages, "response": response}, recording)
+
+    def _load(self, messages: list[dict]) -> dict:
+        path: str = self._path(messages)
+        if not os.path.exists(path):
+            raise LLMServiceException(f"no recorded completion at {path}")
+        with open(path) as recording:
+            return json.load(recording)["response"]
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic offline completions for load tests.
+
+    The same prompt always produces the same valid lesson. Each call waits
+    `latency` seconds for the first token, then emits `tokens_per_second`.
+    """
+
+    def __init__(self, latency: float, tokens_per_second: float) -> None:
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+
+    async def complete(self, messages: list[dict], timeout: float) -> dict:
+        content: str = self.create_content(messages)
+        delay: float = (
+            self.latency + approximate_tokens(content) / self.tokens_per_second
+        )
+        if delay > timeout:
+            await asyncio.sleep(timeout)
+            raise LLMTimeoutException(timeout)
+
+        await asyncio.sleep(delay)
+        return completion_response(content, messages)
+
+    async def stream(self, messages: list[dict], timeout: float) -> AsyncIterator[str]:
+        content: str = self.create_content(messages)
+        if self.latency > timeout:
+            await asyncio.sleep(timeout)
+            raise LLMTimeoutException(timeout)
+
+        await asyncio.sleep(self.latency)
+        # 8 tokens per chunk.
+        for position in range(0, len(content), 32):
+            await asyncio.sleep(8 / self.tokens_per_second)
+            yield content[position : position + 32]
+
+    @staticmethod
+    def create_content(messages: list[dict]) -> str:
+        prompt: str = messages[-1]["content"]
+        generator = random.Random(hashlib.sha256(prompt.encode()).hexdigest())
+        if '"lessons"' not in prompt:
+            return json.dumps({"sections": fake_sections(generator)})
+
+        # batched prompt, one lesson per requested topic.
+        topic_ids: list[str] = re.findall(r"create lesson no\. (\d+),", prompt)
+        lessons: list[dict] = [
+            {"topic": int(topic_id), "sections": fake_sections(generator)}
+            for topic_id in topic_ids
+        ]
+        return json.dumps({"lessons": lessons})
+
+
+# vocabulary of the fake lessons.
+FAKE_WORDS: list[str] = [
+    "budget",
+    "saving",
+    "interest",
+    "income",
+    "expense",
+    "goal",
+    "risk",
+    "return",
+    "inflation",
+    "credit",
+]
+
+
+def fake_sections(generator: random.Random) -> list[dict]:
+    def sentence(length: int) -> str:
+        words = (generator.choice(FAKE_WORDS) for _ in range(length))
+        return " ".join(words).capitalize()
+
+    sections: list[dict] = []
+    for section_id in range(1, generator.randint(3, 5) + 1):
+        content: list[dict] = [
+            {"type": "HEADING", "text": sentence(3)},
+            {"type": "PARAGRAPH", "text": f"{sentence(20)}.\n{sentence(15)}."},
+        ]
+        if generator.random() < 0.5:
+            content.append(
+                {
+                    "type": generator.choice(["ORDERED_LIST", "UNORDERED_LIST"]),
+                    "items": [sentence(6) for _ in range(generator.randint(2, 5))],
+                }
+            )
+        sections.append({"id": section_id, "content": content})
+    return sections
+
+
+def completion_response(content: str, messages: list[dict]) -> dict:
+    """Wrap completion text into the OpenAI response shape."""
+    prompt_tokens: int = sum(approximate_tokens(m["content"]) for m in messages)
+    completion_tokens: int = approximate_tokens(content)
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+_provider: LLMProvider | None = None
+
+
+def get_llm_provider() -> LLMProvider:
+    """Get the provider selected by the `LLM_PROVIDER` setting."""
+    global _provider
+    if _provider is not None:
+        return _provider
+
+    if settings.LLM_PROVIDER == "openai":
+        _provider = OpenAIProvider()
+    elif settings.LLM_PROVIDER == "record":
+        _provider = RecordReplayProvider(settings.LLM_RECORDINGS_DIR, record=True)
+    elif settings.LLM_PROVIDER == "replay":
+        _provider = RecordReplayProvider(settings.LLM_RECORDINGS_DIR)
+    elif settings.LLM_PROVIDER == "fake":
+        _provider = FakeProvider(
+            latency=settings.FAKE_LLM_LATENCY,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+        )
+    else:
+        raise ValueError(f"unknown LLM_PROVIDER {settings.LLM_PROVIDER}")
+    return _provider
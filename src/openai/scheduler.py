@@ -0,0 +1,236 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+
+from src.config import settings
+from src.metrics import metrics
+
+
+class Priority(IntEnum):
+    """Lanes of LLM calls, a lower value is admitted first."""
+
+    # a student is waiting on the response.
+    INTERACTIVE = 0
+    # the next lesson of a student, generated in the background.
+    PREFETCH = 1
+    # warm-up of the whole module catalog.
+    BULK = 2
+
+
+# share of each budget that lower lanes leave free for interactive calls.
+RESERVED_SHARE: dict[Priority, float] = {
+    Priority.INTERACTIVE: 0,
+    Priority.PREFETCH: 0.1,
+    Priority.BULK: 0.25,
+}
+
+
+class PriorityTicket:
+    """
+    Priority of the LLM calls made for one piece of work, e.g. a prefetched
+    lesson. It is raised when a caller of a higher lane starts waiting on
+    the work, see `promote`.
+    """
+
+    def __init__(self, priority: Priority, parent: "PriorityTicket | None") -> None:
+        self.priority = priority
+        # work this is part of, promoting it promotes this work's calls too.
+        self.parent = parent
+        # calls of this work waiting in the scheduler.
+        self.waiting: set[asyncio.Future] = set()
+
+    def chain(self):
+        ticket: PriorityTicket | None = self
+        while ticket is not None:
+            yield ticket
+            ticket = ticket.parent
+
+    def promote(self, priority: Priority):
+        if priority < self.priority:
+            self.priority = priority
+            get_llm_scheduler().promote(self.waiting, priority)
+
+
+# ticket of the work the running task's LLM calls are made for.
+current_ticket: ContextVar[PriorityTicket | None] = ContextVar(
+    "current_ticket", default=None
+)
+
+
+@contextmanager
+def priority_ticket(priority: Priority):
+    """Make the LLM calls made within part of a new piece of work."""
+    ticket = PriorityTicket(priority, parent=current_ticket.get())
+    token = current_ticket.set(ticket)
+    try:
+        yield ticket
+    finally:
+        current_ticket.reset(token)
+
+
+class TokenBucket:
+    """Budget refilled continuously up to `per_minute`."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.rate: float = per_minute / 60
+        self.available: float = self.capacity
+        self.updated_at: float = time.monotonic()
+
+    def refill(self):
+        now: float = time.monotonic()
+        self.available = min(
+            self.capacity, self.available + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def wait_time(self, amount: float, reserved_share: float = 0) -> float:
+        """Seconds until `amount` can be taken, keeping `reserved_share` free."""
+        needed: float = min(amount, self.capacity) + self.capacity * reserved_share
+        needed = min(needed, self.capacity)
+        return max(0.0, (needed - self.available) / self.rate)
+
+    def take(self, amount: float):
+        # may go negative when a call used more than estimated.
+        self.available -= amount
+
+
+class LLMScheduler:
+    """
+    Admit LLM calls within requests-per-minute and tokens-per-minute budgets.
+
+    Waiting calls are admitted by priority, then arrival order. Lower lanes
+    only use the budget above their `reserved_share`, `RESERVED_SHARE` by
+    default, so background work soaks up spare quota without delaying
+    students.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        reserved_share: dict[Priority, float] | None = None,
+    ) -> None:
+        self.reserved_share: dict[Priority, float] = reserved_share or RESERVED_SHARE
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        # (priority, arrival, future, tokens)
+        self.queue: list[tuple[int, int, asyncio.Future, int]] = []
+        self.arrivals = itertools.count()
+        self.dispatcher: asyncio.Task | None = None
+        # set when a call is queued or promoted, the dispatcher re-checks.
+        self.wakeup = asyncio.Event()
+
+    def queue_depth(self, priority: Priority) -> int:
+        return sum(
+            1
+            for lane, _, future, _ in self.queue
+            if lane == priority and not future.done()
+        )
+
+    async def acquire(self, priority: Priority, tokens: int):
+        """Wait until a call estimated to use `tokens` may be sent.
+
+        A call made for promoted work, see `PriorityTicket`, is queued at
+        the work's priority.
+        """
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        ticket: PriorityTicket | None = current_ticket.get()
+        tickets: list[PriorityTicket] = list(ticket.chain()) if ticket else []
+        lane: Priority = min([priority] + [ticket.priority for ticket in tickets])
+        for ticket in tickets:
+            ticket.waiting.add(future)
+        heapq.heappush(self.queue, (lane, next(self.arrivals), future, tokens))
+        if self.dispatcher is None or self.dispatcher.done():
+            # bound to the running loop, like the dispatcher.
+            self.wakeup = asyncio.Event()
+            self.dispatcher = asyncio.ensure_future(self._dispatch())
+        self.wakeup.set()
+
+        enqueued_at: float = time.monotonic()
+        try:
+            await future
+        finally:
+            # a cancelled caller is skipped by the dispatcher.
+            future.cancel()
+            for ticket in tickets:
+                ticket.waiting.discard(future)
+            wait_seconds[priority].observe(time.monotonic() - enqueued_at)
+
+    def promote(self, futures: set[asyncio.Future], priority: Priority):
+        """Move the waiting calls of `futures` up to the lane of `priority`."""
+        if not futures:
+            return
+        self.queue = [
+            (
+                min(lane, priority) if future in futures else lane,
+                arrival,
+                future,
+                tokens,
+            )
+            for lane, arrival, future, tokens in self.queue
+        ]
+        heapq.heapify(self.queue)
+        self.wakeup.set()
+
+    def record_usage(self, estimated_tokens: int, used_tokens: int):
+        """Correct the token budget once the actual usage of a call is known."""
+        self.tokens.take(used_tokens - estimated_tokens)
+
+    async def _dispatch(self):
+        while self.queue:
+            priority, _, future, tokens = self.queue[0]
+            if future.done():
+                heapq.heappop(self.queue)
+                continue
+
+            self.requests.refill()
+            self.tokens.refill()
+            wait: float = max(
+                self.requests.wait_time(1, self.reserved_share[priority]),
+                self.tokens.wait_time(tokens, self.reserved_share[priority]),
+            )
+            if wait > 0:
+                # a call of a higher lane may arrive meanwhile, re-check the head.
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self.queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            future.set_result(None)
+
+
+wait_seconds: dict[Priority, object] = {
+    priority: metrics.histogram(f"llm_scheduler_wait_seconds_{priority.name.lower()}")
+    for priority in Priority
+}
+
+_scheduler: LLMScheduler = LLMScheduler(
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+)
+
+for _priority in Priority:
+    metrics.gauge(
+        f"llm_scheduler_queue_depth_{_priority.name.lower()}",
+        lambda priority=_priority: _scheduler.queue_depth(priority),
+    )
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    return _scheduler
+
+
+def set_llm_scheduler(scheduler: LLMScheduler):
+    """Replace the worker's scheduler, e.g. with the budget of a CLI run."""
+    global _scheduler
+    _scheduler = scheduler
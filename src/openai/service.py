@@ -1,26 +1,31 @@
-import openai
+import asyncio
+import hashlib
+import json
+import time
+from typing import AsyncIterator, Callable, NamedTuple
+
+from fastapi.encoders import jsonable_encoder
+
 from src.config import settings
-from src.learn.serializers import ModuleModel, TopicModel
+from src.learn.serializers import ModuleModel, SectionModel, TopicModel
+from src.metrics import metrics
+from src.openai.breaker import llm_breaker
+from src.openai.exceptions import (
+    LLMQueueTimeoutException,
+    LLMServiceException,
+    LLMTimeoutException,
+)
+from src.openai.providers import LLMProvider, approximate_tokens, get_llm_provider
+from src.openai.scheduler import Priority, get_llm_scheduler
+from src.openai.usage import LLMUsage, llm_first_token_latency, record_llm_call
 
-openai.api_key = settings.OPENAI_API_KEY
+# version of the lesson prompts served by default. Cached lessons are keyed
+# by it, add a version to `PROMPTS` rather than changing an existing one.
+PROMPT_VERSION: str = settings.LLM_PROMPT_VERSION
 
 
-def create_prompt_text(
-    module_number: int,
-    module_name: str,
-    topic_number: int,
-    topic_name: str,
-):
-    return f"""
-Context:
-    - You are a lesson planner with a PhD in education and Finance.
-    - Modules are like chapters, which contain sub-units called topics.
-    - Each topic can have multiple lessons.
-    - A lesson is made up of 1 or more sections.
-    - Create a lesson for:
-    - Module {module_number} - {module_name}"
-    - create lesson no. {topic_number}, title: {topic_name}.
-Specifications:
+# rules shared by the single and batched lesson prompts.
+LESSON_GUIDELINES = """Specifications:
  - The lesson content should be divided into 3 to 5 parts called sections.
  - The format for a section is mentioned later.
 
@@ -43,45 +48,504 @@ Formatting Guidelines:
  - Do not add numbers to the content, that will be handled by the frontend.
  - ORDERED_LIST has items numbered from 1.
  - UNORDERED_LIST has items without any numbers.
+"""
 
-{{ note: this is an example of how a lesson is divided into sections.\n
-\"sections\": [\n {{\n \"id\": 1,\n \"content\": [\n {{\n \"type\":
-\"HEADING\",\n \"text\": \"...section heading\"\n }},\n {{\n \"type\":
+SECTIONS_EXAMPLE = """\"sections\": [\n {\n \"id\": 1,\n \"content\": [\n {\n \"type\":
+\"HEADING\",\n \"text\": \"...section heading\"\n },\n {\n \"type\":
 \"PARAGRAPH\",\n \"text\": \"this is a paragraph, using \n for new lines.\"\n
-}},\n {{\n \"type\": \"ORDERED_LIST\",\n \"items\": [\n \"an item\",\n
-\"another item\" // it can have upto 5 items\n ]\n }},\n {{\n \"type\":
+},\n {\n \"type\": \"ORDERED_LIST\",\n \"items\": [\n \"an item\",\n
+\"another item\" // it can have upto 5 items\n ]\n },\n {\n \"type\":
 \"UNORDERED_LIST\",\n \"items\": [\n \"an item\",\n \"another item\"\n ]\n
-}}\n ]\n }}\n ]\n}}
+}\n ]\n }\n ]"""
+
+
+def create_prompt_text(
+    module_number: int,
+    module_name: str,
+    topic_number: int,
+    topic_name: str,
+):
+    return f"""
+Context:
+    - You are a lesson planner with a PhD in education and Finance.
+    - Modules are like chapters, which contain sub-units called topics.
+    - Each topic can have multiple lessons.
+    - A lesson is made up of 1 or more sections.
+    - Create a lesson for:
+    - Module {module_number} - {module_name}"
+    - create lesson no. {topic_number}, title: {topic_name}.
+{LESSON_GUIDELINES}
+{{ note: this is an example of how a lesson is divided into sections.\n
+{SECTIONS_EXAMPLE}\n}}
 """
 
 
+# follow-up asking for the rest of a lesson that was cut off.
+CONTINUE_PROMPT = """Your lesson was cut off. Write only the sections that are
+still missing, starting from section id {next_section_id}, so the lesson has
+3 to 5 sections in total. Use the same json format: {{"sections": [...]}}"""
+
+
+def create_batch_prompt_text(
+    module_number: int,
+    module_name: str,
+    topics: list[TopicModel],
+):
+    """Prompt for the lessons of several topics of a module in one completion.
+
+    The fixed instructions are sent once instead of once per topic.
+    """
+    lesson_list: str = "\n".join(
+        f"    - create lesson no. {topic.id}, title: {topic.title}." for topic in topics
+    )
+    return f"""
+Context:
+    - You are a lesson planner with a PhD in education and Finance.
+    - Modules are like chapters, which contain sub-units called topics.
+    - Each topic can have multiple lessons.
+    - A lesson is made up of 1 or more sections.
+    - Create one lesson for each of these topics of:
+    - Module {module_number} - {module_name}"
+{lesson_list}
+{LESSON_GUIDELINES} - Each lesson is an item of the \"lessons\" list, in the order
+   given above, with its lesson no. as \"topic\".
+
+{{ note: this is an example of how lessons are divided into sections.\n
+\"lessons\": [\n {{\n \"topic\": 1,\n {SECTIONS_EXAMPLE}\n }}\n ]\n}}
+"""
+
+
+# rules and output format of the compact prompts, with the example written
+# as plain json instead of escaped text.
+COMPACT_LESSON_RULES = """Rules:
+- 3 to 5 sections of at most 100 words, the last one a short summary.
+- Each section: a HEADING, a PARAGRAPH, then optionally an ORDERED_LIST and
+  an UNORDERED_LIST of at most 5 items. Do not number the items.
+- Use \\n between paragraphs.
+Reply with json only, each section shaped like:
+{"id": 1, "content": [{"type": "HEADING", "text": "..."},
+{"type": "PARAGRAPH", "text": "..."}, {"type": "ORDERED_LIST", "items": ["..."]},
+{"type": "UNORDERED_LIST", "items": ["..."]}]}"""
+
+
+def create_compact_prompt_text(
+    module_number: int,
+    module_name: str,
+    topic_number: int,
+    topic_name: str,
+):
+    """Shorter variant of `create_prompt_text` asking for the same output."""
+    return f"""You are a lesson planner with a PhD in education and Finance.
+Write the lesson no. {topic_number}, title: {topic_name}, of module \
+{module_number} - {module_name}.
+{COMPACT_LESSON_RULES}
+Output: {{"sections": [section, ...]}}"""
+
+
+def create_compact_batch_prompt_text(
+    module_number: int,
+    module_name: str,
+    topics: list[TopicModel],
+):
+    """Shorter variant of `create_batch_prompt_text` asking for the same
+    output.
+    """
+    lesson_list: str = "\n".join(
+        f"- create lesson no. {topic.id}, title: {topic.title}." for topic in topics
+    )
+    return f"""You are a lesson planner with a PhD in education and Finance.
+Write one lesson for each of these topics of module {module_number} - \
+{module_name}:
+{lesson_list}
+{COMPACT_LESSON_RULES}
+Output, lessons in the order above:
+{{"lessons": [{{"topic": lesson no., "sections": [section, ...]}}, ...]}}"""
+
+
+class LessonPrompts(NamedTuple):
+    single: Callable[..., str]
+    batch: Callable[..., str]
+
+
+# lesson prompts of each version, cached lessons are keyed by the version.
+PROMPTS: dict[str, LessonPrompts] = {
+    "v1": LessonPrompts(single=create_prompt_text, batch=create_batch_prompt_text),
+    "v2": LessonPrompts(
+        single=create_compact_prompt_text, batch=create_compact_batch_prompt_text
+    ),
+}
+
+# fail at startup rather than on every lesson request.
+for _setting in ("LLM_PROMPT_VERSION", "LLM_PROMPT_EXPERIMENT"):
+    _version: str | None = getattr(settings, _setting)
+    if _version and _version not in PROMPTS:
+        raise ValueError(
+            f"unknown {_setting} {_version}, expected one of {', '.join(PROMPTS)}"
+        )
+
+
+def get_prompt_version(module_number: int, topic_id: int) -> str:
+    """Prompt version of a topic.
+
+    `LLM_PROMPT_EXPERIMENT` is assigned to a stable share of the topics, so
+    every student reaching a topic still shares its cached lesson.
+    """
+    experiment: str | None = settings.LLM_PROMPT_EXPERIMENT
+    if not experiment or settings.LLM_PROMPT_EXPERIMENT_SHARE <= 0:
+        return PROMPT_VERSION
+    digest: bytes = hashlib.sha256(f"{module_number}:{topic_id}".encode()).digest()
+    bucket: float = int.from_bytes(digest[:4], "big") / 2**32
+    if bucket < settings.LLM_PROMPT_EXPERIMENT_SHARE:
+        return experiment
+    return PROMPT_VERSION
+
+
+# seconds from sending a lesson prompt to its last token, per prompt version.
+prompt_latency = {
+    version: metrics.histogram(f"llm_prompt_{version}_latency_seconds")
+    for version in PROMPTS
+}
+# lesson outputs parsed complete at once, or needing repairs, per version.
+prompt_parsed = {
+    version: metrics.counter(f"llm_prompt_{version}_parsed_total")
+    for version in PROMPTS
+}
+prompt_unparsed = {
+    version: metrics.counter(f"llm_prompt_{version}_unparsed_total")
+    for version in PROMPTS
+}
+
+
+def record_prompt_parse(version: str, parsed: bool):
+    """Count whether a lesson output of `version` parsed complete at once."""
+    (prompt_parsed if parsed else prompt_unparsed)[version].inc()
+
+
+def estimate_tokens(prompt: str, completion_tokens: int | None = None) -> int:
+    """Tokens a completion is expected to use, prompt included."""
+    return approximate_tokens(prompt) + (
+        completion_tokens or settings.LLM_COMPLETION_TOKENS_ESTIMATE
+    )
+
+
+# a student's completion was sent a second time after `LLM_HEDGE_AFTER`.
+hedged_requests = metrics.counter("llm_hedged_requests_total")
+# the hedged request answered before the original one.
+hedged_wins = metrics.counter("llm_hedged_wins_total")
+
+
 class OpenAIService:
-    def __init__(self) -> None:
-        self.MODEL = "gpt-3.5-turbo"
+    def __init__(
+        self,
+        timeout: float | None = None,
+        provider: LLMProvider | None = None,
+        usage: LLMUsage | None = None,
+    ) -> None:
+        self.provider: LLMProvider = provider or get_llm_provider()
+        self.MODEL = self.provider.model
+        # seconds after which a completion is cancelled.
+        self.timeout = float(timeout or settings.OPENAI_REQUEST_TIMEOUT)
+        # tokens and time of every call made by this service are added to it.
+        self.usage = usage
 
-    def create_new_lesson(
+    async def create_new_lesson(
         self,
         topic: TopicModel,
         module: ModuleModel,
-    ) -> dict:
-        prompt: str = create_prompt_text(
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> str:
+        version, prompt = self._get_lesson_prompt(topic, module)
+
+        return await self._complete_prompt(prompt, priority, prompt_version=version)
+
+    async def create_new_lessons(
+        self,
+        topics: list[TopicModel],
+        module: ModuleModel,
+        priority: Priority = Priority.BULK,
+    ) -> str:
+        """Generate the lessons of several topics of a module in one call,
+        see `create_batch_prompt_text` for the output shape.
+
+        The prompt version of the first topic is used, batch topics sharing
+        a version so the lessons are cached under it.
+        """
+        version: str = get_prompt_version(module.module_number, topics[0].id)
+        prompt: str = PROMPTS[version].batch(
+            module_number=module.module_number,
+            module_name=module.module_name,
+            topics=topics,
+        )
+        return await self._complete_prompt(
+            prompt,
+            priority,
+            # the completion is about `len(topics)` lessons long.
+            timeout=self._get_timeout(priority) * len(topics),
+            completion_tokens=settings.LLM_COMPLETION_TOKENS_ESTIMATE * len(topics),
+            prompt_version=version,
+        )
+
+    async def continue_lesson(
+        self,
+        topic: TopicModel,
+        module: ModuleModel,
+        sections: list[SectionModel],
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> str:
+        """Ask for the sections missing after `sections`, when a lesson
+        completion was cut off. Only the missing sections are generated.
+        """
+        _, prompt = self._get_lesson_prompt(topic, module)
+        next_section_id: int = max(section.id for section in sections) + 1
+        return await self._complete_messages(
+            messages=[
+                {"role": "user", "content": prompt},
+                {
+                    "role": "assistant",
+                    "content": json.dumps({"sections": jsonable_encoder(sections)}),
+                },
+                {
+                    "role": "user",
+                    "content": CONTINUE_PROMPT.format(
+                        next_section_id=next_section_id
+                    ),
+                },
+            ],
+            priority=priority,
+        )
+
+    async def stream_new_lesson(
+        self,
+        topic: TopicModel,
+        module: ModuleModel,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> AsyncIterator[str]:
+        """Stream the lesson completion as it is generated.
+
+        Streams are not hedged, the timeout applies to each chunk.
+        """
+        version, prompt = self._get_lesson_prompt(topic, module)
+
+        llm_breaker.check()
+        timeout: float = self._get_timeout(priority)
+        scheduler = get_llm_scheduler()
+        estimated_tokens: int = estimate_tokens(prompt)
+        # streamed responses carry no usage, count what was received.
+        completion: list[str] = []
+        started_at: float | None = None
+        try:
+            await self._acquire(priority, estimated_tokens, timeout)
+            started_at = time.monotonic()
+            async for text in self.provider.stream(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt,
+                    },
+                ],
+                timeout=timeout,
+            ):
+                if not completion:
+                    llm_first_token_latency.observe(time.monotonic() - started_at)
+                completion.append(text)
+                yield text
+        except LLMQueueTimeoutException:
+            # never sent, the provider may well be healthy.
+            llm_breaker.release()
+            raise
+        except (LLMTimeoutException, LLMServiceException):
+            llm_breaker.record_failure()
+            raise
+        except BaseException:
+            llm_breaker.release()
+            raise
+        finally:
+            if started_at is not None:
+                prompt_tokens: int = approximate_tokens(prompt)
+                completion_tokens: int = approximate_tokens("".join(completion))
+                scheduler.record_usage(
+                    estimated_tokens, prompt_tokens + completion_tokens
+                )
+                latency: float = time.monotonic() - started_at
+                record_llm_call(
+                    self.usage,
+                    model=self.MODEL,
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    latency_seconds=latency,
+                )
+                prompt_latency[version].observe(latency)
+        llm_breaker.record_success()
+
+    @staticmethod
+    def _get_lesson_prompt(topic: TopicModel, module: ModuleModel) -> tuple[str, str]:
+        """Get the prompt version of a topic and its lesson prompt."""
+        version: str = get_prompt_version(module.module_number, topic.id)
+        prompt: str = PROMPTS[version].single(
             module_number=module.module_number,
             topic_number=topic.id,
             module_name=module.module_name,
             topic_name=topic.title,
         )
+        return version, prompt
 
-        # example without a system message
-        response = openai.ChatCompletion.create(
-            model=self.MODEL,
+    async def _complete_prompt(
+        self,
+        prompt: str,
+        priority: Priority,
+        timeout: float | None = None,
+        completion_tokens: int | None = None,
+        prompt_version: str | None = None,
+    ) -> str:
+        return await self._complete_messages(
             messages=[
                 {
                     "role": "user",
                     "content": prompt,
                 },
             ],
-            temperature=0,
+            priority=priority,
+            timeout=timeout,
+            completion_tokens=completion_tokens,
+            prompt_version=prompt_version,
         )
 
+    async def _complete_messages(
+        self,
+        messages: list[dict],
+        priority: Priority,
+        timeout: float | None = None,
+        completion_tokens: int | None = None,
+        prompt_version: str | None = None,
+    ) -> str:
+        llm_breaker.check()
+        try:
+            response = await self._complete_hedged(
+                messages=messages,
+                priority=priority,
+                timeout=timeout or self._get_timeout(priority),
+                completion_tokens=(
+                    completion_tokens or settings.LLM_COMPLETION_TOKENS_ESTIMATE
+                ),
+                prompt_version=prompt_version,
+            )
+        except LLMQueueTimeoutException:
+            # never sent, the provider may well be healthy.
+            llm_breaker.release()
+            raise
+        except (LLMTimeoutException, LLMServiceException):
+            llm_breaker.record_failure()
+            raise
+        except BaseException:
+            llm_breaker.release()
+            raise
+        llm_breaker.record_success()
+
         output = response["choices"][0]["message"]["content"]
         return output
+
+    def _get_timeout(self, priority: Priority) -> float:
+        if priority == Priority.INTERACTIVE:
+            return min(self.timeout, settings.LLM_INTERACTIVE_TIMEOUT)
+        return self.timeout
+
+    @staticmethod
+    async def _acquire(priority: Priority, estimated_tokens: int, timeout: float):
+        try:
+            await asyncio.wait_for(
+                get_llm_scheduler().acquire(priority, estimated_tokens),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            raise LLMQueueTimeoutException(timeout)
+
+    async def _complete(
+        self,
+        messages: list[dict],
+        priority: Priority,
+        timeout: float,
+        completion_tokens: int,
+        prompt_version: str | None = None,
+    ) -> dict:
+        """Wait for the scheduler, then the completion, within `timeout`."""
+        started_at: float = time.monotonic()
+        estimated_tokens: int = estimate_tokens(
+            "".join(message["content"] for message in messages), completion_tokens
+        )
+        await self._acquire(priority, estimated_tokens, timeout)
+
+        sent_at: float = time.monotonic()
+        remaining: float = timeout - (sent_at - started_at)
+        if remaining <= 0:
+            raise LLMQueueTimeoutException(timeout)
+        response: dict = await self.provider.complete(messages, timeout=remaining)
+
+        latency: float = time.monotonic() - sent_at
+        if prompt_version:
+            prompt_latency[prompt_version].observe(latency)
+        usage: dict | None = response.get("usage")
+        if usage:
+            get_llm_scheduler().record_usage(estimated_tokens, usage["total_tokens"])
+            record_llm_call(
+                self.usage,
+                model=response.get("model") or self.MODEL,
+                prompt_tokens=usage["prompt_tokens"],
+                completion_tokens=usage["completion_tokens"],
+                latency_seconds=latency,
+            )
+        return response
+
+    async def _complete_hedged(
+        self,
+        messages: list[dict],
+        priority: Priority,
+        timeout: float,
+        completion_tokens: int,
+        prompt_version: str | None = None,
+    ) -> dict:
+        """Send a second request when a student's completion is slower than
+        `LLM_HEDGE_AFTER`, the first response wins and the other is cancelled.
+        """
+        hedge_after: float = settings.LLM_HEDGE_AFTER
+        if priority != Priority.INTERACTIVE or not 0 < hedge_after < timeout:
+            return await self._complete(
+                messages, priority, timeout, completion_tokens, prompt_version
+            )
+
+        first: asyncio.Task = asyncio.ensure_future(
+            self._complete(
+                messages, priority, timeout, completion_tokens, prompt_version
+            )
+        )
+        attempts: set[asyncio.Task] = {first}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+            if not done:
+                hedged_requests.inc()
+                attempts.add(
+                    asyncio.ensure_future(
+                        self._complete(
+                            messages,
+                            priority,
+                            timeout - hedge_after,
+                            completion_tokens,
+                            prompt_version,
+                        )
+                    )
+                )
+
+            error: BaseException | None = None
+            while attempts:
+                done, attempts = await asyncio.wait(
+                    attempts, return_when=asyncio.FIRST_COMPLETED
+                )
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not first:
+                            hedged_wins.inc()
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
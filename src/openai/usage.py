@@ -0,0 +1,59 @@
+from pydantic import BaseModel
+
+from src.config import settings
+from src.metrics import metrics
+
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000)
+
+llm_calls = metrics.counter("llm_calls_total")
+llm_prompt_tokens = metrics.histogram("llm_prompt_tokens", buckets=TOKEN_BUCKETS)
+llm_completion_tokens = metrics.histogram(
+    "llm_completion_tokens", buckets=TOKEN_BUCKETS
+)
+# seconds from sending a request to its last token, scheduler wait excluded.
+llm_latency = metrics.histogram("llm_latency_seconds")
+llm_first_token_latency = metrics.histogram("llm_first_token_seconds")
+llm_cost = metrics.counter("llm_cost_usd_total")
+
+
+class LLMUsage(BaseModel):
+    """Tokens, cost and time spent on the LLM calls of one piece of work."""
+
+    model: str | None = None
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0
+    llm_seconds: float = 0
+
+
+def completion_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return (
+        prompt_tokens * settings.LLM_PROMPT_TOKEN_PRICE
+        + completion_tokens * settings.LLM_COMPLETION_TOKEN_PRICE
+    ) / 1000
+
+
+def record_llm_call(
+    usage: LLMUsage | None,
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    latency_seconds: float,
+):
+    """Add a completed LLM call to the metrics and to `usage`, if given."""
+    cost: float = completion_cost(prompt_tokens, completion_tokens)
+    llm_calls.inc()
+    llm_prompt_tokens.observe(prompt_tokens)
+    llm_completion_tokens.observe(completion_tokens)
+    llm_latency.observe(latency_seconds)
+    llm_cost.inc(cost)
+
+    if usage is None:
+        return
+    usage.model = model
+    usage.llm_calls += 1
+    usage.prompt_tokens += prompt_tokens
+    usage.completion_tokens += completion_tokens
+    usage.cost_usd += cost
+    usage.llm_seconds += latency_seconds
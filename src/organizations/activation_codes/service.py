@@ -29,9 +29,14 @@ class ActivationCodeService:
         activation_code: ActivationCode = await self.model.get(activation_code_id)
         return activation_code
 
-    async def get_all(self, skip: int = 0, limit: int = 10):
-        activation_codes: list[ActivationCode] = await self.model.get_all(skip, limit)
-        return activation_codes
+    async def get_all(
+        self, skip: int = 0, limit: int = 10, cursor: str | None = None
+    ) -> tuple[list[ActivationCode], str | None]:
+        activation_codes: list[ActivationCode]
+        activation_codes, next_cursor = await self.model.find_page(
+            cursor=cursor, limit=limit, skip=skip
+        )
+        return activation_codes, next_cursor
 
     async def get_activation_code_by_email(self, student_email: str):
         activation_code: ActivationCode = await self.model.get_by_email(student_email)
@@ -40,8 +45,7 @@ class ActivationCodeService:
     async def update_activation_code(
         self, activation_code_id: int, edit_activation_code_req: EditActivationCode
     ):
-        activation_code: ActivationCode = await self.get(activation_code_id)
-        updated_activation_code: ActivationCode = await self.model.update(
-            activation_code_id, activation_code, edit_activation_code_req
+        updated_activation_code: ActivationCode = await self.model.update_partial(
+            activation_code_id, edit_activation_code_req
         )
         return updated_activation_code
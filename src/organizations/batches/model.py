@@ -1,9 +1,13 @@
 from prisma.models import Batch
 
 from src.crud_base import CRUDBaseModel
+from src.entity_cache import EntityCache
 from src.organizations.batches.serializers import CreateBatch, EditBatch
 
+# batches are rarely edited once created.
+BATCH_CACHE = EntityCache("batch", ttl=60)
+
 
 class BatchModel(CRUDBaseModel[CreateBatch, EditBatch]):
     def __init__(self):
-        super().__init__(Batch)
+        super().__init__(Batch, cache=BATCH_CACHE)
@@ -24,9 +24,8 @@ class BatchService:
     async def update_batch(
             self, batch_id: int, edit_batch_req: EditBatch
     ):
-        batch: Batch = await self.get(batch_id)
-        updated_batch: Batch = await self.model.update(
-            batch_id, batch, edit_batch_req
+        updated_batch: Batch = await self.model.update_partial(
+            batch_id, edit_batch_req
         )
         return updated_batch
 
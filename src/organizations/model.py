@@ -1,12 +1,17 @@
 from prisma.models import Organization
 
 from src.crud_base import CRUDBaseModel
+from src.entity_cache import EntityCache
 from src.organizations.serializers import CreateOrganization, EditOrganization
 
 
+# organizations are read on every join and rarely edited.
+ORGANIZATION_CACHE = EntityCache("organization", ttl=300)
+
+
 class OrganizationModel(CRUDBaseModel[CreateOrganization, EditOrganization]):
     def __init__(self):
-        super().__init__(Organization)
+        super().__init__(Organization, cache=ORGANIZATION_CACHE)
 
     async def get_by_name(self, name: str):
         return await super().get_unique(where={"name": name}, include={})
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, BackgroundTasks, Response
 from prisma.models import Organization, Student, Batch
 
 from src.auth.utils import get_current_admin
@@ -82,9 +82,18 @@ async def create_activation_code(
 
 @router.get("/activation_code/all")
 async def fetch_all_codes(
-    skip: int = 0, limit: int = 10, _: dict = Depends(get_current_admin)
+    response: Response,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: str | None = None,
+    _: dict = Depends(get_current_admin),
 ):
-    return await ActivationCodeService().get_all(skip, limit)
+    activation_codes, next_cursor = await ActivationCodeService().get_all(
+        skip, limit, cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return activation_codes
 
 
 @router.post("/add/student")
@@ -128,7 +137,9 @@ async def join_organization(
     join_req: JoinOrganizationReq, student_token: dict = Depends(get_current_student)
 ):
     organization_service = OrganizationService()
-    student: Student = await StudentService().get_student(student_token["id"])
+    student: Student = await StudentService().get_student(
+        student_token["id"], public=False
+    )
 
     if student.activation_attempts >= StudentRateLimitConfig.MAX_ACTIVATION_ATTEMPTS:
         raise MAX_JOINING_ATTEMPTS
@@ -30,9 +30,8 @@ class OrganizationService:
     async def update_organization(
         self, organization_id: int, edit_organization_req: EditOrganization
     ):
-        organization: Organization = await self.get(organization_id)
-        updated_organization: Organization = await self.model.update(
-            organization_id, organization, edit_organization_req
+        updated_organization: Organization = await self.model.update_partial(
+            organization_id, edit_organization_req
         )
         return updated_organization
 
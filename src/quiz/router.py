@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from prisma.models import Question as QuestionModel
 
 from src.auth.utils import get_current_admin, get_current_user
@@ -27,14 +27,20 @@ async def get_question(question_id: int, _: dict = Depends(get_current_admin)):
 @router.get("/")
 async def get_quiz_by_grade(
     grade: int,
+    response: Response,
     skip: int = 0,
     limit: int = 60,
+    cursor: str | None = None,
     _: dict = Depends(get_current_user),
 ):
     question_service = QuestionService()
-    questions: list[QuestionModel] = await question_service.get_questions_by_grade(
+    questions: list[QuestionModel]
+    questions, next_cursor = await question_service.get_questions_by_grade(
         grade,
         skip,
         limit,
+        cursor,
     )
-    return {"quiz": questions}
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return {"quiz": questions, "next_cursor": next_cursor}
@@ -23,24 +23,25 @@ class QuestionService:
         grade: int,
         skip: int = 0,
         limit: int = 60,
-    ) -> list[Question]:
-        questions: list[Question] = await self.model.find_many(
+        cursor: str | None = None,
+    ) -> tuple[list[Question], str | None]:
+        questions: list[Question]
+        questions, next_cursor = await self.model.find_page(
             where={"grade": grade},
             include={},
+            cursor=cursor,
             skip=skip,
             limit=limit,
         )
-        return questions
+        return questions, next_cursor
 
     async def update_question(
         self,
         question_id: int,
         question_edit: EditQuestion,
     ):
-        question: Question = await self.get_question(question_id)
-        updated_question = await self.model.update(
+        updated_question: Question = await self.model.update_partial(
             question_id,
-            question,
             question_edit,
         )
         return updated_question
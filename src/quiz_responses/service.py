@@ -22,10 +22,8 @@ class QuizResponseService:
         response_id: int,
         response_edit: EditQuizResponse,
     ):
-        response: QuizResponse = await self.get_response(response_id)
-        updated_response = await self.model.update(
+        updated_response: QuizResponse = await self.model.update_partial(
             response_id,
-            response,
             response_edit,
         )
         return updated_response
@@ -3,6 +3,7 @@ from typing import Optional
 
 import pytz
 from prisma.models import Student
+from prisma.partials import StudentPublic
 from pydantic import SecretStr
 
 from src.auth.exceptions import (
@@ -12,6 +13,7 @@ from src.auth.exceptions import (
     USER_NOT_VERIFIED,
 )
 from src.crud_base import CRUDBaseModel
+from src.entity_cache import EntityCache
 from src.exceptions import DBUpdateException
 from src.students.exceptions import MAX_OTP_ATTEMPTS_REACHED
 from src.students.serializers import CreateStudent, EditStudent
@@ -19,9 +21,16 @@ from src.students.utils import StudentRateLimitConfig, model_updated_response
 from src.utils import get_current_time
 
 
+# public profiles read by most student routes. Full rows hold otps and rate
+# limit counters and are always read from the database.
+STUDENT_CACHE = EntityCache(
+    "student", ttl=30, max_bytes=4 * 1024 * 1024, cache_full_rows=False
+)
+
+
 class StudentModel(CRUDBaseModel[CreateStudent, EditStudent]):
     def __init__(self):
-        super().__init__(Student)
+        super().__init__(Student, public_model=StudentPublic, cache=STUDENT_CACHE)
 
     async def join_organization(
         self,
@@ -136,8 +136,14 @@ class StudentService:
         )
         return web_otp, web_otp_expires_at
 
-    async def get_student(self, student_id: int) -> Student:
+    async def get_student(self, student_id: int, public=True) -> Student:
+        """Get a student, only the columns of `StudentPublic` unless `public`
+        is False.
+        """
         where = {"id": student_id}
+        if public:
+            return await self.model.get_unique(where, select=self.model.public_model)
+
         include = {"Organization": False}
         student: Student = await self.model.get_unique(where, include)
         delete_secrets(student)
@@ -204,13 +210,12 @@ class StudentService:
         return response_msg
 
     async def update_student(self, student_id: int, student_edit: EditStudent):
-        student = await self.get_student(student_id)
-
         if hasattr(student_edit, "profile") and student_edit.profile is not None:
             student_edit.profile = student_edit.profile.json(exclude_unset=True)
 
-        updated_student = await self.model.update(student.id, student, student_edit)
-        delete_secrets(updated_student)
+        updated_student: Student = await self.model.update_partial(
+            student_id, student_edit, select=self.model.public_model
+        )
         return updated_student
 
     async def deactivate_account(self, student_id: int) -> dict[str, str] | None:
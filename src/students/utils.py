@@ -42,6 +42,7 @@ def get_current_student(token_data: dict = Depends(get_current_user)):
         "email": token_data["email"],
         "id": token_data["id"],
         "role": token_data["role"],
+        "organization_id": token_data.get("organization_id"),
     }
 
 
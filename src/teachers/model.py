@@ -1,4 +1,5 @@
 from prisma.models import Teacher
+from prisma.partials import TeacherPublic
 
 from src.teachers.serializers import CreateTeacher, EditTeacher
 from src.crud_base import CRUDBaseModel
@@ -6,4 +7,4 @@ from src.crud_base import CRUDBaseModel
 
 class TeacherModel(CRUDBaseModel[CreateTeacher, EditTeacher]):
     def __init__(self):
-        super().__init__(Teacher)
+        super().__init__(Teacher, public_model=TeacherPublic)
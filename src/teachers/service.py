@@ -4,12 +4,6 @@ from src.teachers.model import TeacherModel
 from src.teachers.serializers import CreateTeacher, EditTeacher, CreateTeacherReq
 
 
-def delete_password(teacher: Teacher):
-    if hasattr(teacher, "password"):
-        del teacher.password
-    return teacher
-
-
 class TeacherService:
     def __init__(self) -> None:
         self.model = TeacherModel()
@@ -21,12 +15,13 @@ class TeacherService:
         return new_teacher
 
     async def get_teacher(self, teacher_id: int) -> Teacher:
-        teacher: Teacher = await self.model.get(id_=teacher_id)
-        teacher = delete_password(teacher)
+        teacher: Teacher = await self.model.get(
+            id_=teacher_id, select=self.model.public_model
+        )
         return teacher
 
     async def update_teacher(self, teacher_id: int, teacher_edit: EditTeacher):
-        teacher: Teacher = await self.get_teacher(teacher_id)
-        updated_teacher = await self.model.update(teacher_id, teacher, teacher_edit)
-        delete_password(updated_teacher)
+        updated_teacher: Teacher = await self.model.update_partial(
+            teacher_id, teacher_edit, select=self.model.public_model
+        )
         return updated_teacher
@@ -1,6 +1,30 @@
+import base64
+import json
 from datetime import datetime
 
+from fastapi.encoders import jsonable_encoder
+
+from src.exceptions import InvalidCursorException
+
 
 def get_current_time():
     """Get current time in ISO format."""
     return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort key of the last item of a page into an opaque cursor."""
+    return base64.urlsafe_b64encode(
+        json.dumps(jsonable_encoder(values), separators=(",", ":")).encode()
+    ).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decode a cursor made by `encode_cursor` holding `size` values."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise InvalidCursorException(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorException(cursor)
+    return values
@@ -0,0 +1,19 @@
+import os
+
+# settings read at import time, the tests never connect to these.
+os.environ.setdefault("DATABASE_URL", "mysql://localhost/test")
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost")
+for name in (
+    "JWT_SECRET_KEY",
+    "JWT_ADMIN_SECRET_KEY",
+    "JWT_REFRESH_SECRET_KEY",
+    "GOOGLE_CLIENT_ID",
+    "GOOGLE_CLIENT_SECRET",
+    "GOOGLE_APP_DEBUG_CLIENT_ID",
+    "GOOGLE_APP_RELEASE_CLIENT_ID",
+    "OPENAI_API_KEY",
+    "MAIL_USERNAME",
+    "MAIL_PASSWORD",
+    "MAIL_SERVER",
+):
+    os.environ.setdefault(name, "test")
@@ -0,0 +1,182 @@
+import json
+
+import pytest
+
+from src.learn.model import ContentType, SectionModel
+from src.learn.parser import (
+    MAX_SECTIONS,
+    LessonParseError,
+    SectionStreamParser,
+    append_missing_sections,
+    parse_lesson_batch,
+    parse_lesson_sections,
+)
+
+
+def section_data(section_id: int) -> dict:
+    return {
+        "id": section_id,
+        "content": [
+            {"type": "HEADING", "text": f"Section {section_id}"},
+            {"type": "PARAGRAPH", "text": "Some text."},
+        ],
+    }
+
+
+def lesson_output(count: int) -> str:
+    sections = [section_data(section_id) for section_id in range(1, count + 1)]
+    return "Here is the lesson:\n" + json.dumps({"sections": sections}, indent=2)
+
+
+def feed_in_chunks(text: str, size: int = 7) -> tuple[SectionStreamParser, list]:
+    parser = SectionStreamParser()
+    streamed: list[SectionModel] = []
+    for start in range(0, len(text), size):
+        streamed += parser.feed(text[start : start + size])
+    streamed += parser.finish()
+    return parser, streamed
+
+
+def test_stream_returns_each_section_once():
+    parser, streamed = feed_in_chunks(lesson_output(4))
+
+    assert [section.id for section in streamed] == [1, 2, 3, 4]
+    assert parser.sections == streamed
+    assert not parser.truncated
+    assert not parser.incomplete
+
+
+def test_too_few_sections_are_incomplete():
+    parser, _ = feed_in_chunks(lesson_output(2))
+
+    assert not parser.truncated
+    assert parser.incomplete
+
+
+def test_invalid_blocks_are_dropped():
+    output = json.dumps(
+        {
+            "sections": [
+                {
+                    "id": 1,
+                    "content": [
+                        {"type": "PARAGRAPH", "text": "kept"},
+                        {"type": "PARAGRAPH"},
+                        {"type": "VIDEO", "url": "https://example.com"},
+                        {"type": "unordered_list", "items": ["a", 2, None, " "]},
+                    ],
+                },
+                {"id": 2, "content": [{"type": "HEADING", "text": ""}]},
+            ]
+        }
+    )
+
+    sections: list[SectionModel] = parse_lesson_sections(output)
+
+    assert len(sections) == 1
+    assert [block.type for block in sections[0].content] == [
+        ContentType.PARAGRAPH,
+        ContentType.UNORDERED_LIST,
+    ]
+    assert sections[0].content[1].items == ["a", "2"]
+
+
+def test_comments_and_trailing_commas_are_tolerated():
+    output = """{
+        "sections": [
+            {"id": 1, "content": [{"type": "PARAGRAPH", "text": "a // b"},]},  // one
+        ]
+    }"""
+
+    sections: list[SectionModel] = parse_lesson_sections(output)
+
+    assert sections[0].content[0].text == "a // b"
+
+
+def test_truncated_section_is_repaired():
+    output: str = lesson_output(3)
+    cut_off: str = output[: output.rfind("Some text.") + 4]
+
+    parser, streamed = feed_in_chunks(cut_off)
+
+    assert [section.id for section in streamed] == [1, 2]
+    assert parser.truncated
+    assert parser.incomplete
+    assert parser.repaired.id == 3
+    # the paragraph cut off mid-way is left out rather than kept half written.
+    assert [block.type for block in parser.repaired.content] == [ContentType.HEADING]
+
+
+def test_bare_array_is_accepted():
+    sections = [section_data(1), section_data(2)]
+
+    assert len(parse_lesson_sections(json.dumps(sections))) == 2
+
+
+def test_output_without_sections_raises():
+    with pytest.raises(LessonParseError):
+        parse_lesson_sections("Sorry, I cannot help with that.")
+
+
+def test_missing_sections_are_numbered_after_the_last():
+    parser, _ = feed_in_chunks(lesson_output(2))
+    missing: list[SectionModel] = parse_lesson_sections(lesson_output(2))
+
+    added = append_missing_sections(parser.sections, missing)
+
+    assert [section.id for section in added] == [3, 4]
+    assert [section.id for section in parser.sections] == [1, 2, 3, 4]
+
+
+def test_missing_sections_stop_at_max_sections():
+    sections: list[SectionModel] = parse_lesson_sections(lesson_output(3))
+    missing: list[SectionModel] = parse_lesson_sections(lesson_output(4))
+
+    append_missing_sections(sections, missing)
+
+    assert len(sections) == MAX_SECTIONS
+
+
+def test_truncated_lesson_longer_than_max_sections_gets_no_missing_sections():
+    output: str = lesson_output(MAX_SECTIONS + 2)
+    parser, _ = feed_in_chunks(output[: output.rfind("Some text.")])
+    assert parser.truncated
+    assert len(parser.sections) > MAX_SECTIONS
+    missing: list[SectionModel] = parse_lesson_sections(lesson_output(3))
+
+    added = append_missing_sections(parser.sections, missing)
+
+    assert added == []
+    assert len(parser.sections) == MAX_SECTIONS + 1
+
+
+def test_batch_skips_incomplete_lessons():
+    output = json.dumps(
+        {
+            "lessons": [
+                {"topic": 1, "sections": [section_data(i) for i in range(1, 4)]},
+                {"topic": "2", "sections": [section_data(i) for i in range(1, 5)]},
+                {"topic": 3, "sections": [section_data(1)]},
+                {"topic": None, "sections": [section_data(i) for i in range(1, 4)]},
+            ]
+        }
+    )
+
+    sections_by_topic = parse_lesson_batch(output)
+
+    assert {topic: len(s) for topic, s in sections_by_topic.items()} == {1: 3, 2: 4}
+
+
+def test_truncated_batch_keeps_the_complete_lessons():
+    output = json.dumps(
+        {
+            "lessons": [
+                {"topic": 1, "sections": [section_data(i) for i in range(1, 4)]},
+                {"topic": 2, "sections": [section_data(i) for i in range(1, 4)]},
+            ]
+        }
+    )
+
+    sections_by_topic = parse_lesson_batch(output[: output.rfind("Section 2")])
+
+    assert list(sections_by_topic) == [1]
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from src.openai.scheduler import (
+    LLMScheduler,
+    Priority,
+    TokenBucket,
+    get_llm_scheduler,
+    priority_ticket,
+    set_llm_scheduler,
+)
+
+NO_RESERVE: dict[Priority, float] = {priority: 0 for priority in Priority}
+
+
+@pytest.fixture
+def scheduler():
+    """A scheduler with an empty request budget refilled every 10ms."""
+    scheduler = LLMScheduler(
+        requests_per_minute=6000, tokens_per_minute=10**6, reserved_share=NO_RESERVE
+    )
+    scheduler.requests.available = 0
+    previous: LLMScheduler = get_llm_scheduler()
+    set_llm_scheduler(scheduler)
+    yield scheduler
+    set_llm_scheduler(previous)
+
+
+async def acquire_in_order(scheduler: LLMScheduler, calls: list) -> list:
+    """Queue `calls`, (name, priority) pairs, and return the names as admitted."""
+    admitted: list = []
+
+    async def call(name, priority: Priority):
+        await scheduler.acquire(priority, tokens=10)
+        admitted.append(name)
+
+    await asyncio.gather(*(call(name, priority) for name, priority in calls))
+    return admitted
+
+
+def test_bucket_wait_time():
+    bucket = TokenBucket(per_minute=600)
+    bucket.available = 100
+
+    assert bucket.wait_time(10) == 0
+    # 10 plus the reserved 150 of 600, 60 missing at 10 per second.
+    assert bucket.wait_time(10, reserved_share=0.25) == pytest.approx(6)
+    # a call larger than the whole budget waits for a full bucket only.
+    assert bucket.wait_time(1000) == pytest.approx(50)
+
+
+def test_calls_are_admitted_by_priority_then_arrival(scheduler):
+    calls = [
+        ("bulk", Priority.BULK),
+        ("prefetch", Priority.PREFETCH),
+        ("interactive 1", Priority.INTERACTIVE),
+        ("interactive 2", Priority.INTERACTIVE),
+    ]
+
+    admitted: list = asyncio.run(acquire_in_order(scheduler, calls))
+
+    assert admitted == ["interactive 1", "interactive 2", "prefetch", "bulk"]
+
+
+def test_reserved_share_is_left_to_interactive_calls():
+    scheduler = LLMScheduler(requests_per_minute=6000, tokens_per_minute=10**6)
+    scheduler.requests.available = scheduler.requests.capacity * 0.2
+
+    async def admitted_within(priority: Priority, seconds: float) -> bool:
+        try:
+            await asyncio.wait_for(scheduler.acquire(priority, 10), seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # BULK leaves 25% of the budget free, it takes 0.05 * 60s to refill.
+    assert not asyncio.run(admitted_within(Priority.BULK, 0.1))
+    assert asyncio.run(admitted_within(Priority.INTERACTIVE, 0.1))
+
+
+def test_cancelled_calls_are_skipped(scheduler):
+    async def run() -> list:
+        admitted: list = []
+
+        async def call(name):
+            await scheduler.acquire(Priority.BULK, 10)
+            admitted.append(name)
+
+        cancelled = asyncio.ensure_future(call("cancelled"))
+        kept = asyncio.ensure_future(call("kept"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, kept, return_exceptions=True)
+        return admitted
+
+    assert asyncio.run(run()) == ["kept"]
+    assert scheduler.queue == []
+
+
+def test_promoted_work_overtakes_lower_lanes(scheduler):
+    async def run() -> list:
+        admitted: list = []
+
+        async def call(name, priority: Priority):
+            await scheduler.acquire(priority, 10)
+            admitted.append(name)
+
+        async def prefetch():
+            with priority_ticket(Priority.BULK) as ticket:
+                tickets.append(ticket)
+                await call("promoted", Priority.BULK)
+
+        tickets: list = []
+        tasks = [
+            asyncio.ensure_future(prefetch()),
+            asyncio.ensure_future(call("prefetch", Priority.PREFETCH)),
+        ]
+        await asyncio.sleep(0)
+        # a student starts waiting on the work of the ticket.
+        tickets[0].promote(Priority.INTERACTIVE)
+        await asyncio.gather(*tasks)
+        return admitted
+
+    assert asyncio.run(run()) == ["promoted", "prefetch"]
+
+
+def test_a_higher_lane_call_does_not_wait_out_a_lower_lane_sleep(scheduler):
+    async def run() -> float:
+        loop = asyncio.get_running_loop()
+        # BULK keeps 25% free, it sleeps for the refill of the reserve.
+        scheduler.reserved_share = {**NO_RESERVE, Priority.BULK: 0.25}
+        bulk = asyncio.ensure_future(scheduler.acquire(Priority.BULK, 10))
+        await asyncio.sleep(0.05)
+
+        started: float = loop.time()
+        await scheduler.acquire(Priority.INTERACTIVE, 10)
+        waited: float = loop.time() - started
+        bulk.cancel()
+        await asyncio.gather(bulk, return_exceptions=True)
+        return waited
+
+    assert asyncio.run(run()) < 0.5